@@ -1,30 +1,119 @@
+import math
+import time
+import argparse
+
 import cv2
 import numpy as np
 
-def align_images(img1, img2, mkpts0, mkpts1):
-    # Compute homography from img2 -> img1
-    H, mask = cv2.findHomography(mkpts1, mkpts0, cv2.RANSAC, 5.0)
+# Robust homography estimators (cv2.findHomography methods). PROSAC samples
+# the best-ranked matches first: matches must be ordered best first (SIFT/ORB
+# by descriptor distance, LoFTR by confidence) or `scores` given.
+HOMOGRAPHY_ESTIMATORS = {
+    "ransac": cv2.RANSAC,
+    "rho": cv2.RHO,
+    "lmeds": cv2.LMEDS,
+    "usac": cv2.USAC_DEFAULT,
+    "usac_fast": cv2.USAC_FAST,
+    "usac_accurate": cv2.USAC_ACCURATE,
+    "magsac": cv2.USAC_MAGSAC,
+    "prosac": cv2.USAC_PROSAC,
+}
+ransac_thresh = 5.0
+ransac_max_iters = 2000
+ransac_confidence = 0.995
 
-    h1, w1 = img1.shape[:2]
-    h2, w2 = img2.shape[:2]
+def find_homography(mkpts0, mkpts1, estimator="ransac", threshold=None, max_iters=None,
+                    confidence=None, scores=None, top_k=None):
+    # Compute homography from img2 -> img1. With `scores` (higher is better)
+    # matches are ranked by score; `top_k` keeps only the best k. The returned
+    # mask is aligned with the input matches either way.
+    if estimator not in HOMOGRAPHY_ESTIMATORS:
+        raise ValueError(f"Estimator must be one of {', '.join(HOMOGRAPHY_ESTIMATORS)}")
+    order = None
+    if scores is not None:
+        order = np.argsort(-np.asarray(scores), kind="stable")
+    if top_k and len(mkpts0) > top_k:
+        order = (order if order is not None else np.arange(len(mkpts0)))[:top_k]
+    src, dst = mkpts1, mkpts0
+    if order is not None:
+        src, dst = mkpts1[order], mkpts0[order]
+    if len(src) < 4:
+        return None, np.zeros((len(mkpts0), 1), np.uint8)
+
+    H, mask = cv2.findHomography(src, dst, HOMOGRAPHY_ESTIMATORS[estimator],
+                                 threshold or ransac_thresh, maxIters=max_iters or ransac_max_iters,
+                                 confidence=confidence or ransac_confidence)
+    if order is not None and mask is not None:
+        full = np.zeros((len(mkpts0), 1), np.uint8)
+        full[order] = mask
+        mask = full
+    return H, mask
+
+def ransac_iterations(inlier_ratio, confidence=None, max_iters=None, sample_size=4):
+    # Iterations an adaptive RANSAC needs to reach `confidence` at this inlier
+    # ratio; OpenCV does not report its actual count, so this is the estimate
+    confidence = confidence or ransac_confidence
+    max_iters = max_iters or ransac_max_iters
+    p_good = inlier_ratio ** sample_size
+    if p_good <= 0:
+        return max_iters
+    if p_good >= 1:
+        return 1
+    return int(min(max_iters, math.ceil(math.log(1 - confidence) / math.log(1 - p_good))))
+
+# Canvas-size guard: reject homographies that would blow up the output
+# before any full-canvas allocation happens
+MAX_CANVAS_PIXELS = 200_000_000
+MAX_CANVAS_RATIO = 20.0
+
+def project_corners(shape, H):
+    if H is None or not np.all(np.isfinite(H)):
+        raise ValueError("Degenerate homography: estimation failed")
+
+    h, w = shape[:2]
+    corners = np.array([[0,0], [w,0], [w,h], [0,h]], dtype=np.float64)
+
+    # A non-positive w means a corner maps to/behind infinity
+    denom = corners @ H[2, :2] + H[2, 2]
+    if np.any(denom <= 1e-8 * abs(H[2, 2])):
+        raise ValueError("Degenerate homography: image corners project past the horizon")
+    return cv2.perspectiveTransform(corners.reshape(-1,1,2), H).reshape(-1,2)
+
+def compute_canvas(img1_shape, img2_shape, H, max_canvas_pixels=MAX_CANVAS_PIXELS,
+                   max_canvas_ratio=MAX_CANVAS_RATIO):
+    h1, w1 = img1_shape[:2]
+    h2, w2 = img2_shape[:2]
 
     # Corners of img2
-    corners_img2 = np.array([[0,0], [w2,0], [w2,h2], [0,h2]], dtype=np.float32)
-    corners_img2_h = cv2.perspectiveTransform(corners_img2.reshape(-1,1,2), H).reshape(-1,2)
+    corners_img2_h = project_corners(img2_shape, H)
 
     # Corners of img1
-    corners_img1 = np.array([[0,0], [w1,0], [w1,h1], [0,h1]], dtype=np.float32)
+    corners_img1 = np.array([[0,0], [w1,0], [w1,h1], [0,h1]], dtype=np.float64)
 
     all_corners = np.vstack((corners_img1, corners_img2_h))
-    [xmin, ymin] = np.floor(all_corners.min(axis=0)).astype(int)
-    [xmax, ymax] = np.ceil(all_corners.max(axis=0)).astype(int)
+    [xmin, ymin] = np.floor(all_corners.min(axis=0)).astype(np.int64)
+    [xmax, ymax] = np.ceil(all_corners.max(axis=0)).astype(np.int64)
 
     # Output size
-    out_w = xmax - xmin
-    out_h = ymax - ymin
+    out_w = int(xmax - xmin)
+    out_h = int(ymax - ymin)
+
+    canvas_pixels = out_w * out_h
+    if max_canvas_pixels and canvas_pixels > max_canvas_pixels:
+        raise ValueError(f"Degenerate homography: canvas {out_w}x{out_h} exceeds "
+                         f"{max_canvas_pixels} pixels")
+    if max_canvas_ratio and canvas_pixels > max_canvas_ratio * (h1 * w1 + h2 * w2):
+        raise ValueError(f"Degenerate homography: canvas {out_w}x{out_h} is more than "
+                         f"{max_canvas_ratio}x the input area")
 
     # Translation to shift coordinates to positive
     T = np.array([[1, 0, -xmin], [0, 1, -ymin], [0,0,1]], dtype=np.float64)
+    return T, out_w, out_h
+
+def warp_images(img1, img2, H, max_canvas_pixels=MAX_CANVAS_PIXELS):
+    h1, w1 = img1.shape[:2]
+    T, out_w, out_h = compute_canvas(img1.shape, img2.shape, H, max_canvas_pixels)
+    xmin, ymin = -int(T[0, 2]), -int(T[1, 2])
 
     # Warp img2 into panorama coordinates
     warped_img2 = cv2.warpPerspective(img2, T.dot(H), (out_w, out_h))
@@ -35,4 +124,165 @@ def align_images(img1, img2, mkpts0, mkpts1):
     y_off = -ymin
     pano_img1[y_off:y_off+h1, x_off:x_off+w1] = img1
 
-    return pano_img1, warped_img2
\ No newline at end of file
+    return pano_img1, warped_img2
+
+# Alignment quality gate: below these a pair is reported as degenerate; callers
+# that opt in (reject_degenerate) skip it before the costly warp / blend
+MIN_INLIERS = 10
+MIN_INLIER_RATIO = 0.1
+MAX_REPROJ_ERROR = 4.0  # RMS over RANSAC inliers, in img1 pixels
+
+def reprojection_error(H, mkpts0, mkpts1):
+    # RMS distance between img1 keypoints and their img2 matches mapped by H
+    if len(mkpts0) == 0:
+        return None
+    projected = cv2.perspectiveTransform(np.float64(mkpts1).reshape(-1, 1, 2), H).reshape(-1, 2)
+    return float(np.sqrt(np.mean(np.sum((projected - mkpts0) ** 2, axis=1))))
+
+def estimate_alignment(mkpts0, mkpts1, img1_shape, img2_shape, max_canvas_pixels=MAX_CANVAS_PIXELS,
+                       min_inliers=MIN_INLIERS, min_inlier_ratio=MIN_INLIER_RATIO,
+                       max_reproj_error=MAX_REPROJ_ERROR, estimator=None, scores=None):
+    # Homography img2 -> img1 plus everything needed to judge it; `reason`
+    # says why a degenerate alignment was rejected. `estimator` holds
+    # find_homography options, e.g. {"estimator": "magsac", "top_k": 1000}.
+    estimator = dict(estimator or {})
+    n = len(mkpts0)
+    alignment = {"H": None, "matches": n, "inliers": 0, "inlier_ratio": 0.0,
+                 "reproj_error": None, "canvas_size": None, "degenerate": True, "reason": None,
+                 "estimator": estimator.get("estimator", "ransac"), "estimate_time": 0.0,
+                 "est_iterations": None}
+    if n < 4:
+        alignment["reason"] = f"only {n} matches, need at least 4"
+        return alignment
+
+    start = time.perf_counter()
+    H, mask = find_homography(mkpts0, mkpts1, scores=scores, **estimator)
+    alignment["estimate_time"] = time.perf_counter() - start
+    if H is None:
+        alignment["reason"] = "homography estimation failed"
+        return alignment
+    inlier_mask = mask.ravel().astype(bool)
+    alignment["H"] = H
+    alignment["inliers"] = int(inlier_mask.sum())
+    # Ratio over the matches the estimator actually saw (top_k may drop some)
+    alignment["inlier_ratio"] = alignment["inliers"] / min(n, estimator.get("top_k") or n)
+    # Formula estimate from the inlier ratio, not a count OpenCV reports
+    alignment["est_iterations"] = ransac_iterations(alignment["inlier_ratio"],
+                                                    estimator.get("confidence"),
+                                                    estimator.get("max_iters"))
+    alignment["reproj_error"] = reprojection_error(H, mkpts0[inlier_mask], mkpts1[inlier_mask])
+
+    try:
+        _, out_w, out_h = compute_canvas(img1_shape, img2_shape, H, max_canvas_pixels)
+        alignment["canvas_size"] = (out_w, out_h)
+    except ValueError as e:
+        alignment["reason"] = str(e)
+        return alignment
+
+    if min_inliers and alignment["inliers"] < min_inliers:
+        alignment["reason"] = f"{alignment['inliers']} inliers, need at least {min_inliers}"
+    elif min_inlier_ratio and alignment["inlier_ratio"] < min_inlier_ratio:
+        alignment["reason"] = (f"inlier ratio {alignment['inlier_ratio']:.3f} "
+                               f"below {min_inlier_ratio}")
+    elif (max_reproj_error and alignment["reproj_error"] is not None
+          and alignment["reproj_error"] > max_reproj_error):
+        alignment["reason"] = (f"reprojection error {alignment['reproj_error']:.2f}px "
+                               f"above {max_reproj_error}px")
+    alignment["degenerate"] = alignment["reason"] is not None
+    return alignment
+
+def corner_error(H, H_true, shape2):
+    # Mean distance, in img1 pixels, between img2's corners mapped by the
+    # estimated and by the ground-truth homography (both img2 -> img1)
+    try:
+        estimated = project_corners(shape2, np.asarray(H, dtype=np.float64))
+    except ValueError:
+        return None
+    true = project_corners(shape2, np.asarray(H_true, dtype=np.float64))
+    return float(np.linalg.norm(estimated - true, axis=1).mean())
+
+def alignment_summary(alignment):
+    # JSON-friendly copy (H as nested lists)
+    summary = dict(alignment)
+    if summary["H"] is not None:
+        summary["H"] = np.asarray(summary["H"]).tolist()
+    if summary["canvas_size"] is not None:
+        summary["canvas_size"] = list(summary["canvas_size"])
+    return summary
+
+def align_images(img1, img2, mkpts0, mkpts1, max_canvas_pixels=MAX_CANVAS_PIXELS, **criteria):
+    # Returns (pano_img1, warped_img2, alignment); the images are None when
+    # the alignment is degenerate, so nothing is warped for a failed pair
+    alignment = estimate_alignment(mkpts0, mkpts1, img1.shape, img2.shape, max_canvas_pixels,
+                                   **criteria)
+    if alignment["degenerate"]:
+        return None, None, alignment
+    pano_img1, warped_img2 = warp_images(img1, img2, alignment["H"], max_canvas_pixels)
+    return pano_img1, warped_img2, alignment
+
+# ===============================
+# Estimator comparison
+# ===============================
+def compare_estimators(mkpts0, mkpts1, estimators, scores=None, repeats=5, top_k=None,
+                       max_iters=None, confidence=None, baseline="ransac"):
+    # Time, estimated iterations and inlier-set agreement (Jaccard against
+    # `baseline`) of each estimator on the same matches
+    rows = []
+    base_inliers = None
+    for name in [baseline] + [e for e in estimators if e != baseline]:
+        options = {"estimator": name, "top_k": top_k, "max_iters": max_iters,
+                   "confidence": confidence}
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            H, mask = find_homography(mkpts0, mkpts1, scores=scores, **options)
+            times.append(time.perf_counter() - start)
+        inliers = set(np.flatnonzero(mask.ravel())) if H is not None else set()
+        sampled = max(min(len(mkpts0), top_k or len(mkpts0)), 1)
+        if base_inliers is None:
+            base_inliers = inliers
+        union = inliers | base_inliers
+        rows.append({
+            "estimator": name,
+            "time_ms": 1000 * float(np.median(times)),
+            "inliers": len(inliers),
+            "est_iterations": ransac_iterations(len(inliers) / sampled, confidence, max_iters),
+            "jaccard": len(inliers & base_inliers) / len(union) if union else 1.0,
+            "reproj_error": (reprojection_error(H, mkpts0[mask.ravel() > 0],
+                                                mkpts1[mask.ravel() > 0])
+                             if H is not None else None),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    from io_utils import load_images
+    from feature_match import detect_features, match_descriptors, match_features_loftr, select_matcher
+
+    parser = argparse.ArgumentParser(description="Compare robust homography estimators on one pair")
+    parser.add_argument("image1")
+    parser.add_argument("image2")
+    parser.add_argument("--method", default="SIFT", choices=["SIFT", "ORB", "LoFTR"])
+    parser.add_argument("--estimators", nargs="+", default=list(HOMOGRAPHY_ESTIMATORS),
+                        choices=list(HOMOGRAPHY_ESTIMATORS))
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--max-iters", type=int, default=None)
+    parser.add_argument("--confidence", type=float, default=None)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    img1, img2 = load_images(args.image1, args.image2)
+    model = select_matcher(args.method)
+    if args.method == "LoFTR":
+        mkpts0, mkpts1, scores = match_features_loftr(img1, img2, model, return_scores=True)
+    else:
+        pts1, des1 = detect_features(img1, model)
+        pts2, des2 = detect_features(img2, model)
+        mkpts0, mkpts1, scores = match_descriptors(pts1, des1, pts2, des2, return_scores=True)
+    print(f"{len(mkpts0)} matches")
+    print(f"{'estimator':<15}{'time ms':>9}{'est it':>7}{'inliers':>9}{'jaccard':>9}{'rms px':>8}")
+    for row in compare_estimators(mkpts0, mkpts1, args.estimators, scores, args.repeats,
+                                  args.top_k, args.max_iters, args.confidence):
+        rms = f"{row['reproj_error']:.2f}" if row["reproj_error"] is not None else "-"
+        print(f"{row['estimator']:<15}{row['time_ms']:>9.2f}{row['est_iterations']:>7}"
+              f"{row['inliers']:>9}{row['jaccard']:>9.3f}{rms:>8}")
@@ -1,53 +1,538 @@
 import os
-from io_utils import load_images, save_image
-from feature_match import select_matcher, match_features_cv, match_features_loftr
+from concurrent.futures import ThreadPoolExecutor
+from io_utils import load_images, save_image, decode_image, encode_image
+import feature_match
+from feature_match import (detect_features, detector_config, match_descriptors, match_features_loftr,
+                           match_features_loftr_batch)
 from visualization import draw_matches, draw_keypoints
-from alignment import align_images
-from blending import blend_images
+from alignment import estimate_alignment, alignment_summary, warp_images, MAX_CANVAS_PIXELS
+from blending import run_blender
+from model_registry import ModelRegistry
+from feature_cache import FeatureCache
+from result_cache import ResultCache, result_key
+from timing import StageTimer
 import cv2
+import time
+# tiled_warp (tifffile), multiscale, panorama and video_stitch are imported
+# by the methods that use them, so a plain pair stitch never loads them
+
+# Which outputs run_pipeline produces:
+#   "none"     - nothing is written, the blended array is only returned
+#   "stitched" - only the blended panorama is written
+#   "all"      - panorama plus keypoint / match visualizations
+ARTIFACTS = ("none", "stitched", "all")
+
+# method="auto" tries these matchers cheapest first and keeps the first whose
+# alignment reaches both thresholds; override per call with `cascade`
+AUTO_METHOD = "auto"
+CASCADE_DEFAULTS = {
+    "tiers": ["ORB", "SIFT", "LoFTR"],
+    "min_inliers": 40,
+    "min_inlier_ratio": 0.3,
+}
+
+
+def resolve_cascade(cascade=None):
+    unknown = set(cascade or {}) - set(CASCADE_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown cascade options: {sorted(unknown)}")
+    cascade = {**CASCADE_DEFAULTS, **(cascade or {})}
+    if not cascade["tiers"] or AUTO_METHOD in cascade["tiers"]:
+        raise ValueError("cascade tiers must list at least one concrete method")
+    return cascade
 
 class ImageAlignBackend:
-    def __init__(self):
+    def __init__(self, max_models=3, warmup=None, max_canvas_pixels=MAX_CANVAS_PIXELS,
+                 feature_cache_items=64, feature_cache_dir=None, result_cache_dir=None,
+                 result_cache_bytes=1 << 30):
         self.project_output_dir = "outputs"
         os.makedirs(self.project_output_dir, exist_ok=True)
+        self.max_canvas_pixels = max_canvas_pixels
+
+        # Detectors / models stay resident between runs (LRU bounded)
+        self.models = ModelRegistry(max_models=max_models)
+        if warmup:
+            self.models.warmup(warmup)
+
+        # Keypoints / descriptors keyed by image content, so repeated images skip detection
+        self.features = FeatureCache(max_items=feature_cache_items, cache_dir=feature_cache_dir)
+
+        # Finished stitches keyed by both images' content + method + config (optional)
+        self.results = (ResultCache(result_cache_dir, max_bytes=result_cache_bytes)
+                        if result_cache_dir else None)
+
+        # Background writer for deferred visualizations (created on first use)
+        self._writer = None
+        self._pending = []
+
+    def _submit_artifacts(self, fn, *args):
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifact-writer")
+        self._pending = [f for f in self._pending if not f.done()]
+        future = self._writer.submit(fn, *args)
+        future.add_done_callback(_report_artifact_error)
+        self._pending.append(future)
+        return future
+
+    def _cached_detector(self, method, detector):
+        config = detector_config(method)
+        return lambda img: self.features.get_or_detect(
+            img, config, lambda im: detect_features(im, detector))
+
+    def _pair_matcher(self, method, timer, matcher_engine="bf"):
+        model = self.models.get(method)
+        if method in ["SIFT", "ORB"]:
+            detect = self._cached_detector(method, model)
 
-    def run_pipeline(self, path1, path2, method):
+            def match_pair(img_a, img_b):
+                with timer.stage("detect"):
+                    pts1, des1 = detect(img_a)
+                    pts2, des2 = detect(img_b)
+                with timer.stage("match"):
+                    return match_descriptors(pts1, des1, pts2, des2, matcher_engine)
+        else:
+            def match_pair(img_a, img_b):
+                # LoFTR detects and matches in a single forward pass
+                with timer.stage("match"):
+                    return match_features_loftr(img_a, img_b, model)
+        return match_pair
+
+    def _result_key(self, img1, img2, method, blender="feather", blender_options=None,
+                    matcher_engine="bf", multiscale=False, scale_limits=None,
+                    alignment_criteria=None, estimator=None, cascade=None, **_):
+        if method == AUTO_METHOD:
+            cascade = resolve_cascade(cascade)
+            detector = [detector_config(tier) for tier in cascade["tiers"]]
+        else:
+            cascade, detector = None, detector_config(method)
+        return result_key(img1, img2, method, {
+            "detector": detector,
+            "cascade": cascade,
+            "max_matches": feature_match.max_matches,
+            "ratio_thresh": feature_match.ratio_thresh,
+            "matcher_engine": matcher_engine,
+            "multiscale": multiscale,
+            "scale_limits": scale_limits,
+            "blender": blender,
+            "blender_options": blender_options or {},
+            "max_canvas_pixels": self.max_canvas_pixels,
+            "alignment_criteria": alignment_criteria or {},
+            "estimator": estimator or {},
+        })
+
+    def _match_cascade(self, img1, img2, cascade, timer, matcher_engine="bf", multiscale=False,
+                       scale_limits=None, estimator=None, alignment_criteria=None):
+        # Matches and aligns with each tier in turn until one clears the
+        # cascade thresholds; if none does, the tier with the most inliers
+        # (preferring non-degenerate ones) is kept. A tier that raises (e.g.
+        # model weights unavailable) is recorded and skipped.
+        # Returns (tier, mkpts0, mkpts1, alignment, attempts).
+        attempts = []
+        best = None
+        for tier in cascade["tiers"]:
+            try:
+                match_pair = self._pair_matcher(tier, timer, matcher_engine)
+                if multiscale:
+                    from multiscale import match_multiscale
+                    mkpts0, mkpts1 = match_multiscale(img1, img2, match_pair, tier, scale_limits)
+                else:
+                    mkpts0, mkpts1 = match_pair(img1, img2)
+            except Exception as e:
+                if best is None and tier == cascade["tiers"][-1]:
+                    raise
+                attempts.append({"tier": tier, "error": str(e), "passed": False})
+                continue
+            with timer.stage("homography"):
+                alignment = estimate_alignment(mkpts0, mkpts1, img1.shape, img2.shape,
+                                               self.max_canvas_pixels, estimator=estimator,
+                                               **(alignment_criteria or {}))
+            passed = (not alignment["degenerate"]
+                      and alignment["inliers"] >= cascade["min_inliers"]
+                      and alignment["inlier_ratio"] >= cascade["min_inlier_ratio"])
+            attempts.append({"tier": tier, "matches": alignment["matches"],
+                             "inliers": alignment["inliers"],
+                             "inlier_ratio": alignment["inlier_ratio"], "passed": passed})
+            rank = (passed, not alignment["degenerate"], alignment["inliers"])
+            if best is None or rank > best[0]:
+                best = (rank, tier, mkpts0, mkpts1, alignment)
+            if passed:
+                break
+        return best[1:] + (attempts,)
+
+    def wait_for_artifacts(self):
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.exception()
+
+    def run_pipeline(self, path1, path2, method, output_dir=None, artifacts="all",
+                     defer_visualization=False, blender="feather", blender_options=None,
+                     tiled=False, tile_size=None, matcher_engine="bf", multiscale=False,
+                     scale_limits=None, images=None, matches=None, timer=None,
+                     write_to_disk=True, reject_degenerate=False, alignment_criteria=None,
+                     estimator=None, cascade=None, load_max_dim=None, trace_blend_memory=False,
+                     result_key=None):
+        # `images` / `matches` let a caller that already loaded or matched the
+        # pair (see run_batch) skip those stages. With write_to_disk=False the
+        # requested artifacts are only returned as arrays; paths then only name
+        # outputs and may be None when `images` is given. A degenerate alignment
+        # (see alignment.estimate_alignment, thresholds overridable through
+        # `alignment_criteria`) is only flagged in the summary (degenerate,
+        # reason) and stitched as before; with reject_degenerate=True it
+        # returns early with rejected=True and no panorama. A pair with no
+        # usable homography or canvas cannot be warped and is always rejected.
+        # `estimator` selects the robust homography estimator, e.g.
+        # {"estimator": "magsac", "max_iters": 1000, "top_k": 500}.
+        # method="auto" escalates through the `cascade` tiers (see
+        # CASCADE_DEFAULTS); the alignment summary then records the winning
+        # tier and every attempt. load_max_dim decodes both images with their
+        # longest side capped (a cheaper, downscaled stitch). trace_blend_memory
+        # reports the blender's peak memory (blend.peak_mb) at some speed cost.
+        # `result_key` passes in a result-cache key the caller already computed
+        # for these images and settings (see run_batch), saving a rehash.
+        if artifacts not in ARTIFACTS:
+            raise ValueError(f"artifacts must be one of {ARTIFACTS}")
+        if tiled and (artifacts == "none" or blender != "feather" or not write_to_disk):
+            raise ValueError("Tiled mode streams a feather blend to disk: "
+                             "it needs artifacts != 'none', blender='feather' and write_to_disk")
+        if method == AUTO_METHOD:
+            cascade = resolve_cascade(cascade)
+            if matches is not None:
+                raise ValueError("matches cannot be supplied with method='auto'")
+        output_dir = output_dir or self.project_output_dir
+        timer = timer or StageTimer()
         print(f"Running {method}...")
-        img1, img2 = load_images(path1, path2)
+        if images is None:
+            with timer.stage("load"):
+                images = load_images(path1, path2, load_max_dim)
+        img1, img2 = images
 
         # Extract base names (without extension)
-        name1 = os.path.splitext(os.path.basename(path1))[0]
-        name2 = os.path.splitext(os.path.basename(path2))[0]
+        name1 = os.path.splitext(os.path.basename(path1 or "image1"))[0]
+        name2 = os.path.splitext(os.path.basename(path2 or "image2"))[0]
+
+        # --- Result cache: a hit skips matching, RANSAC, warp and blend ---
+        cache_key = cached = None
+        if self.results is not None and not tiled:
+            with timer.stage("cache"):
+                cache_key = result_key or self._result_key(img1, img2, method, blender,
+                                                           blender_options, matcher_engine,
+                                                           multiscale, scale_limits,
+                                                           alignment_criteria, estimator, cascade)
+                cached = self.results.get(cache_key)
 
         # --- Feature matching ---
-        if method in ["SIFT", "ORB"]:
-            detector = select_matcher(method)
-            mkpts0, mkpts1 = match_features_cv(img1, img2, detector)
+        alignment = cascade_info = None
+        if cached is not None:
+            mkpts0, mkpts1 = cached["mkpts0"], cached["mkpts1"]
+        elif method == AUTO_METHOD:
+            # The cascade aligns each tier to judge it, so homography is done here too
+            tier, mkpts0, mkpts1, alignment, attempts = self._match_cascade(
+                img1, img2, cascade, timer, matcher_engine, multiscale, scale_limits,
+                estimator, alignment_criteria)
+            cascade_info = {"tier": tier, "cascade": attempts}
+        elif matches is not None:
+            mkpts0, mkpts1 = matches
         else:
-            loftr = select_matcher(method)
-            mkpts0, mkpts1 = match_features_loftr(img1, img2, loftr)
+            match_pair = self._pair_matcher(method, timer, matcher_engine)
+            if multiscale:
+                # Coarse homography on downscaled copies, refined on the overlap window
+                from multiscale import match_multiscale
+                mkpts0, mkpts1 = match_multiscale(img1, img2, match_pair, method, scale_limits)
+            else:
+                mkpts0, mkpts1 = match_pair(img1, img2)
 
         # Output paths
-        feat1_path = os.path.join(self.project_output_dir, f"{name1}_features_{method.lower()}.jpg")
-        feat2_path = os.path.join(self.project_output_dir, f"{name2}_features_{method.lower()}.jpg")
-        matches_path = os.path.join(self.project_output_dir, f"{name1}_{name2}_matches_{method.lower()}.jpg")
+        feat1_path = feat2_path = matches_path = None
+        visualizations = {"features1": None, "features2": None, "matches": None}
+        if artifacts == "all" and write_to_disk:
+            feat1_path = os.path.join(output_dir, f"{name1}_features_{method.lower()}.jpg")
+            feat2_path = os.path.join(output_dir, f"{name2}_features_{method.lower()}.jpg")
+            matches_path = os.path.join(output_dir, f"{name1}_{name2}_matches_{method.lower()}.jpg")
+
+            # Draw & save visualizations, optionally off the critical path
+            vis_args = (img1, img2, mkpts0, mkpts1, feat1_path, feat2_path, matches_path)
+            if defer_visualization:
+                self._submit_artifacts(write_visualizations, *vis_args)
+            else:
+                visualizations = write_visualizations(*vis_args, timer=timer)
+        elif artifacts == "all":
+            visualizations = draw_visualizations(img1, img2, mkpts0, mkpts1, timer)
 
-        # Draw & save visualizations
-        draw_keypoints(img1, mkpts0, feat1_path)
-        draw_keypoints(img2, mkpts1, feat2_path)
-        draw_matches(img1, img2, mkpts0, mkpts1, matches_path)
+        if cached is not None:
+            return self._finish_cached(cached, timer, output_dir, name1, name2, method,
+                                       artifacts, write_to_disk,
+                                       (feat1_path, feat2_path, matches_path), visualizations)
 
         # Align & blend
-        pano_img1, warped_img2 = align_images(img1, img2, mkpts0, mkpts1)
-        blended = blend_images(pano_img1, warped_img2)
+        if alignment is None:
+            with timer.stage("homography"):
+                alignment = estimate_alignment(mkpts0, mkpts1, img1.shape, img2.shape,
+                                               self.max_canvas_pixels, estimator=estimator,
+                                               **(alignment_criteria or {}))
+        summary = dict(alignment_summary(alignment), **(cascade_info or {}))
+        H = alignment["H"]
+        unwarpable = H is None or alignment["canvas_size"] is None
+        if alignment["degenerate"] and (reject_degenerate or unwarpable):
+            # Early exit: a pair that cannot stitch is never warped or blended
+            return {
+                "stitched": None,
+                "features1": feat1_path,
+                "features2": feat2_path,
+                "matches": matches_path,
+                "blended": None,
+                "visualizations": visualizations,
+                "blend": {"blender": blender, "time": None, "peak_mb": None},
+                "alignment": summary,
+                "rejected": True,
+                "cached": False,
+                "encoded": {},
+                "timings": timer.as_dict(),
+            }
 
-        # Save result
-        result_path = os.path.join(self.project_output_dir, f"{name1}_{name2}_blended_{method.lower()}.jpg")
-        save_image(result_path, blended)
+        if tiled:
+            # Warp, blend and encode are interleaved tile by tile
+            result_path = os.path.join(output_dir, f"{name1}_{name2}_blended_{method.lower()}.tif")
+            from tiled_warp import warp_blend_tiled, TILE_SIZE
+            with timer.stage("warp"):
+                warp_blend_tiled(img1, img2, H, result_path, tile_size or TILE_SIZE,
+                                 self.max_canvas_pixels)
+            return {
+                "stitched": result_path,
+                "features1": feat1_path,
+                "features2": feat2_path,
+                "matches": matches_path,
+                "blended": None,
+                "visualizations": visualizations,
+                "blend": {"blender": "feather", "time": None, "peak_mb": None},
+                "alignment": summary,
+                "rejected": False,
+                "cached": False,
+                "encoded": {},
+                "timings": timer.as_dict(),
+            }
 
-        return {
+        with timer.stage("warp"):
+            pano_img1, warped_img2 = warp_images(img1, img2, H, self.max_canvas_pixels)
+        with timer.stage("blend"):
+            blended, blend_stats = run_blender(blender, pano_img1, warped_img2,
+                                               trace_memory=trace_blend_memory,
+                                               **(blender_options or {}))
+
+        # Save result; with the result cache on, the JPEG is encoded once and
+        # the same bytes are written, cached and handed back. Degenerate stitches
+        # (kept only because reject_degenerate=False) are never cached, so a
+        # later rejecting run cannot be served one.
+        cacheable = cache_key is not None and not alignment["degenerate"]
+        result_path = None
+        encoded = {}
+        if cacheable:
+            with timer.stage("encode"):
+                encoded["stitched"] = encode_image(blended)
+        if artifacts != "none" and write_to_disk:
+            result_path = os.path.join(output_dir, f"{name1}_{name2}_blended_{method.lower()}.jpg")
+            with timer.stage("encode"):
+                if encoded:
+                    _write_bytes(result_path, encoded["stitched"])
+                else:
+                    save_image(result_path, blended)
+
+        result = {
             "stitched": result_path,
             "features1": feat1_path,
             "features2": feat2_path,
             "matches": matches_path,
-        }
\ No newline at end of file
+            "blended": blended,
+            "visualizations": visualizations,
+            "blend": blend_stats,
+            "alignment": summary,
+            "rejected": False,
+            "cached": False,
+            "encoded": encoded,
+            "timings": timer.as_dict(),
+        }
+        if cacheable:
+            self.results.put(cache_key, encoded["stitched"], mkpts0, mkpts1, {
+                "alignment": result["alignment"],
+                "blend": blend_stats,
+                "timings": result["timings"],
+            })
+        return result
+
+    def _finish_cached(self, cached, timer, output_dir, name1, name2, method, artifacts,
+                       write_to_disk, vis_paths, visualizations):
+        meta = cached["meta"]
+        result_path = None
+        if artifacts != "none" and write_to_disk:
+            result_path = os.path.join(output_dir, f"{name1}_{name2}_blended_{method.lower()}.jpg")
+            with timer.stage("encode"):
+                _write_bytes(result_path, cached["stitched"])
+        with timer.stage("load"):
+            blended = decode_image(cached["stitched"])
+        return {
+            "stitched": result_path,
+            "features1": vis_paths[0],
+            "features2": vis_paths[1],
+            "matches": vis_paths[2],
+            "blended": blended,
+            "visualizations": visualizations,
+            "blend": meta["blend"],
+            "alignment": meta["alignment"],
+            "rejected": False,
+            "cached": True,
+            "cached_timings": meta["timings"],
+            "encoded": {"stitched": cached["stitched"]},
+            "timings": timer.as_dict(),
+        }
+
+    def run_batch(self, path_pairs, method, output_dirs=None, images=None, **kwargs):
+        # Runs many pairs with one method. LoFTR pairs are matched together in
+        # padded batches; every other stage runs per pair as in run_pipeline.
+        # `images` may hold already loaded pairs (None entries are loaded here).
+        # Returns one result dict (or the raised exception) per pair, in order.
+        output_dirs = output_dirs or [None] * len(path_pairs)
+        timers = [StageTimer() for _ in path_pairs]
+        results = [None] * len(path_pairs)
+
+        images = list(images or [None] * len(path_pairs))
+        for i, (path1, path2) in enumerate(path_pairs):
+            if images[i] is not None:
+                continue
+            try:
+                with timers[i].stage("load"):
+                    images[i] = load_images(path1, path2, kwargs.get("load_max_dim"))
+            except Exception as e:
+                results[i] = e
+
+        matches = [None] * len(path_pairs)
+        keys = [None] * len(path_pairs)
+        loaded = [i for i in range(len(path_pairs)) if images[i] is not None]
+        if self.results is not None and not kwargs.get("tiled"):
+            # Cached pairs are served by run_pipeline without matching; each key
+            # is hashed once here and handed on
+            for i in loaded:
+                with timers[i].stage("cache"):
+                    keys[i] = self._result_key(*images[i], method, **kwargs)
+            loaded = [i for i in loaded if keys[i] not in self.results]
+        if method == "LoFTR" and not kwargs.get("multiscale") and loaded:
+            model = self.models.get(method)
+            start = time.perf_counter()
+            try:
+                batch = match_features_loftr_batch([images[i] for i in loaded], model)
+            except Exception as e:
+                batch = [e] * len(loaded)
+            # The batched forward pass is charged evenly to its pairs
+            share = (time.perf_counter() - start) / len(loaded)
+            for i, pair_matches in zip(loaded, batch):
+                timers[i].add("match", share)
+                if isinstance(pair_matches, Exception):
+                    results[i] = pair_matches
+                else:
+                    matches[i] = pair_matches
+
+        for i, (path1, path2) in enumerate(path_pairs):
+            if results[i] is not None:
+                continue
+            try:
+                results[i] = self.run_pipeline(path1, path2, method, output_dir=output_dirs[i],
+                                               images=images[i], matches=matches[i],
+                                               timer=timers[i], result_key=keys[i], **kwargs)
+            except Exception as e:
+                results[i] = e
+        return results
+
+    def run_panorama(self, paths, method, output_dir=None, k_neighbors=4, window=None,
+                     artifacts="stitched", matcher_engine="bf"):
+        if artifacts not in ARTIFACTS:
+            raise ValueError(f"artifacts must be one of {ARTIFACTS}")
+        output_dir = output_dir or self.project_output_dir
+        timer = StageTimer()
+        print(f"Running {method} panorama on {len(paths)} images...")
+        with timer.stage("load"):
+            images = []
+            for path in paths:
+                img = cv2.imread(path)
+                if img is None:
+                    raise FileNotFoundError(f"Check image path: {path}")
+                images.append(img)
+
+        from panorama import stitch_panorama
+        model = self.models.get(method)
+        detect = self._cached_detector(method, model) if method in ["SIFT", "ORB"] else None
+        panorama, info = stitch_panorama(images, method, model, k_neighbors, window,
+                                         max_canvas_pixels=self.max_canvas_pixels, timer=timer,
+                                         detect=detect, matcher_engine=matcher_engine)
+
+        result_path = None
+        if artifacts != "none":
+            name = os.path.splitext(os.path.basename(paths[info["reference"]]))[0]
+            result_path = os.path.join(output_dir, f"{name}_panorama_{len(info['order'])}_{method.lower()}.jpg")
+            with timer.stage("encode"):
+                save_image(result_path, panorama)
+
+        info.update({
+            "stitched": result_path,
+            "blended": panorama,
+            "timings": timer.as_dict(),
+        })
+        return info
+
+    def run_stream(self, source, method, output_dir=None, step=1, max_dim=None,
+                   matcher_engine="bf", **options):
+        # Streams a video / frame directory through video_stitch.stitch_stream
+        # and writes each panorama segment as soon as it is finished, so only
+        # one segment is ever held in memory. `options` go to stitch_stream.
+        if method not in ["SIFT", "ORB"]:
+            raise ValueError("Streaming needs a keypoint method (SIFT or ORB)")
+        from video_stitch import iter_frames, stitch_stream, STREAM_MAX_CANVAS_PIXELS
+        output_dir = output_dir or self.project_output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        options.setdefault("max_canvas_pixels", min(self.max_canvas_pixels, STREAM_MAX_CANVAS_PIXELS))
+        timer = StageTimer()
+        stats = {}
+        name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+        print(f"Streaming {method} from {source}...")
+
+        frames = iter_frames(source, step, max_dim)
+        segments = []
+        for segment in stitch_stream(frames, self.models.get(method), matcher_engine,
+                                     timer=timer, stats=stats, **options):
+            path = os.path.join(output_dir, f"{name}_segment{len(segments):03d}_{method.lower()}.jpg")
+            panorama = segment.pop("panorama")
+            with timer.stage("encode"):
+                save_image(path, panorama)
+            segment["canvas_size"] = [panorama.shape[1], panorama.shape[0]]
+            segment["stitched"] = path
+            segments.append(segment)
+        return {"segments": segments, "stats": stats, "timings": timer.as_dict()}
+
+
+def draw_visualizations(img1, img2, mkpts0, mkpts1, timer=None):
+    timer = timer or StageTimer()
+    with timer.stage("visualize"):
+        return {
+            "features1": draw_keypoints(img1, mkpts0),
+            "features2": draw_keypoints(img2, mkpts1),
+            "matches": draw_matches(img1, img2, mkpts0, mkpts1),
+        }
+
+
+def write_visualizations(img1, img2, mkpts0, mkpts1, feat1_path, feat2_path, matches_path,
+                         timer=None):
+    timer = timer or StageTimer()
+    visualizations = draw_visualizations(img1, img2, mkpts0, mkpts1, timer)
+    with timer.stage("encode"):
+        save_image(feat1_path, visualizations["features1"])
+        save_image(feat2_path, visualizations["features2"])
+        save_image(matches_path, visualizations["matches"])
+    return visualizations
+
+
+def _write_bytes(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _report_artifact_error(future):
+    if future.exception() is not None:
+        print(f"[WARN] visualization writer failed: {future.exception()}")
@@ -1,3 +1,6 @@
+import time
+import threading
+import tracemalloc
 import cv2
 import numpy as np
 
@@ -15,3 +18,245 @@ def blend_images(img1, warped):
 
     blended = img1_f * (1 - blurred_3c) + warped_f * blurred_3c
     return blended.astype(np.uint8)
+
+FEATHER_KSIZE = 51
+
+def blend_images_inplace(img1, warped, out=None, strip_rows=1024):
+    # Same feathering as blend_images, but only the bounding box of the warped
+    # image is touched, it is processed in row strips and the result is written
+    # straight into a uint8 buffer (img1 itself unless `out` is given).
+    if out is None:
+        out = img1
+    elif out is not img1:
+        np.copyto(out, img1)
+
+    h, w = warped.shape[:2]
+    mask = np.any(warped, axis=2)
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return out
+    cols = np.flatnonzero(mask.any(axis=0))
+
+    # Pixels outside the mask keep img1; the blur only reaches `pad` pixels
+    pad = FEATHER_KSIZE // 2
+    top, bottom = rows[0], rows[-1] + 1
+    x0, x1 = max(cols[0] - pad, 0), min(cols[-1] + 1 + pad, w)
+    y0, y1 = max(top - pad, 0), min(bottom + pad, h)
+
+    for sy in range(top, bottom, strip_rows):
+        ey = min(sy + strip_rows, bottom)
+        hy0, hy1 = max(sy - pad, y0), min(ey + pad, y1)
+
+        strip_mask = mask[hy0:hy1, x0:x1].astype(np.float32)
+        blurred = cv2.GaussianBlur(strip_mask, (FEATHER_KSIZE, FEATHER_KSIZE), 0)
+        blurred = blurred[sy - hy0:ey - hy0]
+
+        # prevent black borders from blending
+        blurred[~mask[sy:ey, x0:x1]] = 0
+
+        blurred_3c = blurred[:, :, None]
+        base = out[sy:ey, x0:x1]
+        blended = base.astype(np.float32) * (1 - blurred_3c) + warped[sy:ey, x0:x1].astype(np.float32) * blurred_3c
+        base[...] = blended.astype(np.uint8)
+    return out
+
+
+# ===============================
+# Seam finders
+# ===============================
+def _bbox(mask, margin=0):
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    h, w = mask.shape
+    return (max(rows[0] - margin, 0), min(rows[-1] + 1 + margin, h),
+            max(cols[0] - margin, 0), min(cols[-1] + 1 + margin, w))
+
+
+def voronoi_seam(a, b, m1, m2):
+    # Each pixel goes to the image whose valid region it lies deeper inside
+    d1 = cv2.distanceTransform(m1.astype(np.uint8), cv2.DIST_L2, 3)
+    d2 = cv2.distanceTransform(m2.astype(np.uint8), cv2.DIST_L2, 3)
+    return d2 > d1
+
+
+def dp_seam(a, b, m1, m2):
+    # Minimum-cost top-to-bottom seam through the colour difference, found by
+    # dynamic programming. Returns True where the second image should be used.
+    cost = cv2.absdiff(a, b).sum(axis=2, dtype=np.float32)
+    cost[~(m1 & m2)] = 1e6
+
+    only1 = m1 & ~m2
+    only2 = m2 & ~m1
+    ys1, xs1 = np.nonzero(only1)
+    ys2, xs2 = np.nonzero(only2)
+    transpose = False
+    if len(xs1) and len(xs2):
+        transpose = abs(ys2.mean() - ys1.mean()) > abs(xs2.mean() - xs1.mean())
+    if transpose:
+        cost = cost.T
+
+    # Row by row (each row depends on the previous one), but every row update
+    # is a few in-place ufuncs over preallocated buffers. Ties go left, then
+    # straight, like argmin over (left, up, right).
+    h, w = cost.shape
+    acc = cost.copy()
+    padded = np.full(w + 2, np.inf, dtype=acc.dtype)
+    best = np.empty(w, dtype=acc.dtype)
+    for y in range(1, h):
+        padded[1:-1] = acc[y - 1]
+        np.minimum(padded[:-2], padded[1:-1], out=best)
+        np.minimum(best, padded[2:], out=best)
+        acc[y] += best
+
+    # Backtrack by re-taking the same argmin over the accumulated costs
+    seam = np.empty(h, dtype=np.intp)
+    seam[-1] = np.argmin(acc[-1])
+    for y in range(h - 1, 0, -1):
+        x0 = max(seam[y] - 1, 0)
+        seam[y - 1] = x0 + np.argmin(acc[y - 1, x0:seam[y] + 2])
+    right_side = np.arange(w)[None, :] >= seam[:, None]
+    if transpose:
+        right_side = right_side.T
+
+    # The second image takes the side where it has more exclusive coverage
+    if len(xs2) and right_side[ys2, xs2].mean() < 0.5:
+        return ~right_side
+    return right_side
+
+
+def graphcut_seam(a, b, m1, m2):
+    finder = cv2.detail_GraphCutSeamFinder("COST_COLOR")
+    masks = finder.find(
+        [cv2.UMat(a.astype(np.float32)), cv2.UMat(b.astype(np.float32))],
+        [(0, 0), (0, 0)],
+        [cv2.UMat(m1.astype(np.uint8) * 255), cv2.UMat(m2.astype(np.uint8) * 255)],
+    )
+    return masks[1].get() > 0
+
+
+SEAM_FINDERS = {
+    "voronoi": voronoi_seam,
+    "dp": dp_seam,
+    "graphcut": graphcut_seam,
+}
+
+
+# ===============================
+# Seam / multi-band blenders
+# ===============================
+def _overlap_roi(img1, warped, margin):
+    m1 = np.any(img1, axis=2)
+    m2 = np.any(warped, axis=2)
+    out = img1.copy()
+    only2 = m2 & ~m1
+    out[only2] = warped[only2]
+    overlap = m1 & m2
+    if not overlap.any():
+        return out, None
+    y0, y1, x0, x1 = _bbox(overlap, margin)
+    return out, (slice(y0, y1), slice(x0, x1), m1[y0:y1, x0:x1], m2[y0:y1, x0:x1])
+
+
+def _seam_weight(a, b, m1, m2, seam):
+    weight = SEAM_FINDERS[seam](a, b, m1, m2).astype(np.float32)
+    weight[~m1] = 1
+    weight[~m2] = 0
+    return weight
+
+
+def seam_blend(img1, warped, seam="dp"):
+    # Hard cut along the seam: no ghosting, but exposure steps stay visible
+    out, roi = _overlap_roi(img1, warped, margin=1)
+    if roi is None:
+        return out
+    ys, xs, m1, m2 = roi
+    a, b = img1[ys, xs], warped[ys, xs]
+    weight = _seam_weight(a, b, m1, m2, seam) > 0.5
+    region = out[ys, xs]
+    region[weight & m2] = b[weight & m2]
+    region[~weight & m1] = a[~weight & m1]
+    return out
+
+
+def multiband_blend(img1, warped, bands=5, seam="voronoi"):
+    # Laplacian pyramid blending restricted to the overlap ROI
+    out, roi = _overlap_roi(img1, warped, margin=2 ** bands)
+    if roi is None:
+        return out
+    ys, xs, m1, m2 = roi
+    a, b = img1[ys, xs], warped[ys, xs]
+    weight = _seam_weight(a, b, m1, m2, seam)
+
+    # Fill each image's holes with the other so pyramids don't pull in black
+    a = np.where(m1[:, :, None], a, b).astype(np.float32)
+    b = np.where(m2[:, :, None], b, a).astype(np.float32)
+
+    bands = max(1, min(bands, int(np.log2(min(weight.shape))) - 1))
+    gw = [weight]
+    ga, gb = [a], [b]
+    for _ in range(bands):
+        ga.append(cv2.pyrDown(ga[-1]))
+        gb.append(cv2.pyrDown(gb[-1]))
+        gw.append(cv2.pyrDown(gw[-1]))
+
+    blended = ga[-1] * (1 - gw[-1][:, :, None]) + gb[-1] * gw[-1][:, :, None]
+    for level in range(bands - 1, -1, -1):
+        size = (ga[level].shape[1], ga[level].shape[0])
+        la = ga[level] - cv2.pyrUp(ga[level + 1], dstsize=size)
+        lb = gb[level] - cv2.pyrUp(gb[level + 1], dstsize=size)
+        w3 = gw[level][:, :, None]
+        blended = cv2.pyrUp(blended, dstsize=size) + la * (1 - w3) + lb * w3
+
+    valid = m1 | m2
+    region = out[ys, xs]
+    region[valid] = np.clip(blended, 0, 255).astype(np.uint8)[valid]
+    return out
+
+
+# ===============================
+# Blender registry
+# ===============================
+BLENDERS = {
+    "feather": blend_images_inplace,
+    "multiband": multiband_blend,
+    "seam": seam_blend,
+}
+
+
+# tracemalloc is process-global: traced blends are serialised so concurrent
+# callers cannot reset or stop each other's trace
+_trace_lock = threading.Lock()
+
+
+def run_blender(name, img1, warped, trace_memory=False, **options):
+    # Runs a blender and reports its wall time. With trace_memory (the
+    # benchmark) the peak traced memory is reported too; tracing slows
+    # Python-heavy blenders noticeably, so it is off otherwise (peak_mb=None).
+    if name not in BLENDERS:
+        raise ValueError(f"Blender must be one of {', '.join(BLENDERS)}")
+
+    if not trace_memory:
+        start = time.perf_counter()
+        blended = BLENDERS[name](img1, warped, **options)
+        return blended, {"blender": name, "time": time.perf_counter() - start, "peak_mb": None}
+
+    with _trace_lock:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            blended = BLENDERS[name](img1, warped, **options)
+        finally:
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            if not tracing:
+                tracemalloc.stop()
+
+    return blended, {
+        "blender": name,
+        "time": elapsed,
+        "peak_mb": (peak - base) / 1e6,
+    }
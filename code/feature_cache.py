@@ -0,0 +1,80 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from io_utils import image_hash
+
+
+class FeatureCache:
+    # Keypoint / descriptor cache keyed by image content hash + detector config.
+    # A bounded in-memory LRU sits in front of an optional on-disk tier that
+    # stores plain arrays in .npz files (no pickled cv2.KeyPoint objects).
+
+    def __init__(self, max_items=64, cache_dir=None):
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return self._items[key]
+
+        if self.cache_dir and os.path.exists(self._disk_path(key)):
+            try:
+                with np.load(self._disk_path(key)) as data:
+                    pts = data["pts"]
+                    des = data["des"] if data["has_des"] else None
+            except (OSError, ValueError, KeyError):
+                # Truncated or foreign file: treat as a miss and overwrite later
+                return None
+            self._remember(key, (pts, des))
+            with self._lock:
+                self._stats["disk_hits"] += 1
+            return pts, des
+        return None
+
+    def put(self, key, pts, des):
+        self._remember(key, (pts, des))
+        if self.cache_dir:
+            # Write then rename so concurrent readers never see partial files
+            tmp_path = self._disk_path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, pts=pts, has_des=des is not None,
+                         des=des if des is not None else np.zeros((0, 0), np.uint8))
+            os.replace(tmp_path, self._disk_path(key))
+
+    def _remember(self, key, value):
+        if not self.max_items:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get_or_detect(self, img, config, detect):
+        key = f"{image_hash(img)}-{config}"
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            self._stats["misses"] += 1
+        pts, des = detect(img)
+        self.put(key, pts, des)
+        return pts, des
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, resident=len(self._items))
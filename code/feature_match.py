@@ -1,11 +1,33 @@
+import importlib
+
 import cv2
 import numpy as np
-import torch
-import kornia as K
-import kornia.feature as KF
 
 max_nfeatures = 5000
 max_matches = 500
+loftr_profile = "fp32"  # see inference_profile.PROFILES
+
+# ===============================
+# Matcher plugins
+# ===============================
+# Methods beyond the built-in OpenCV detectors live in their own modules,
+# imported on first use so classical-only processes never pay for torch.
+# A plugin module provides load_matcher() and matcher_config().
+MATCHER_PLUGINS = {
+    "LoFTR": "loftr_matcher",
+}
+BUILTIN_METHODS = ("SIFT", "ORB")
+
+def register_matcher(method, module_name):
+    MATCHER_PLUGINS[method] = module_name
+
+def matcher_methods():
+    return list(BUILTIN_METHODS) + list(MATCHER_PLUGINS)
+
+def load_plugin(method):
+    if method not in MATCHER_PLUGINS:
+        raise ValueError(f"Method must be one of {', '.join(matcher_methods())}")
+    return importlib.import_module(MATCHER_PLUGINS[method])
 
 def select_matcher(method):
     if method == "SIFT":
@@ -14,40 +36,132 @@ def select_matcher(method):
     elif method == "ORB":
         # detector = cv2.ORB_create()
         detector = cv2.ORB_create(nfeatures=max_nfeatures)
-    elif method == "LoFTR":
-        detector = KF.LoFTR(pretrained='outdoor').eval()
     else:
-        raise ValueError("Method must be SIFT, ORB, or LoFTR")
+        detector = load_plugin(method).load_matcher()
     return detector
 
-def match_features_cv(img1, img2, detector):
-    kp1, des1 = detector.detectAndCompute(img1, None)
-    kp2, des2 = detector.detectAndCompute(img2, None)
+def detector_config(method):
+    # Everything that changes detectAndCompute output, used as a cache key
+    if method in BUILTIN_METHODS:
+        return f"{method}-n{max_nfeatures}-cv{cv2.__version__}"
+    return load_plugin(method).matcher_config()
 
+def detect_features(img, detector):
+    kps, des = detector.detectAndCompute(img, None)
+    pts = cv2.KeyPoint_convert(kps).reshape(-1, 2) if kps else np.zeros((0, 2), np.float32)
+    return pts, des
+
+# ===============================
+# Descriptor matcher engines
+# ===============================
+# Each engine returns the two nearest neighbours of every query descriptor as
+# (distances, indices) arrays of shape (n, 2); distances are L2 for float
+# descriptors and Hamming for binary ones. Index -1 marks a missing neighbour.
+ratio_thresh = 0.75
+knn_chunk = 1024
+
+def _knn_bf(des1, des2):
     bf = cv2.BFMatcher(cv2.NORM_L2 if des1.dtype != np.uint8 else cv2.NORM_HAMMING)
     matches = bf.knnMatch(des1, des2, k=2)
-    good = [m for m, n in matches if m.distance < 0.75 * n.distance]
+    dist = np.full((len(des1), 2), np.inf, dtype=np.float32)
+    idx = np.full((len(des1), 2), -1, dtype=np.int64)
+    for m in matches:
+        for k, d in enumerate(m[:2]):
+            dist[d.queryIdx, k] = d.distance
+            idx[d.queryIdx, k] = d.trainIdx
+    return dist, idx
 
-    good = sorted(good, key=lambda m: m.distance)[:max_matches]
-    mkpts0 = np.float32([kp1[m.queryIdx].pt for m in good])
-    mkpts1 = np.float32([kp2[m.trainIdx].pt for m in good])
-    return mkpts0, mkpts1
+def _knn_flann(des1, des2):
+    # KD-tree forest for float descriptors (SIFT), LSH for binary ones (ORB)
+    if des1.dtype == np.uint8:
+        params = dict(algorithm=6, table_number=6, key_size=12, multi_probe_level=1)
+    else:
+        params = dict(algorithm=1, trees=5)
+    index = cv2.flann_Index(des2, params)
+    idx, dist = index.knnSearch(des1, 2, params=dict(checks=50))
+    dist = dist.astype(np.float32)
+    if des1.dtype != np.uint8:
+        # The KD-tree reports squared L2 distances
+        dist = np.sqrt(dist)
+    idx = idx.astype(np.int64)
+    dist[idx < 0] = np.inf
+    return dist, idx
 
-def match_features_loftr(img1, img2, loftr):
+def _pairwise_numpy(a, b):
+    if a.dtype == np.uint8:
+        # Hamming distance from bit-unpacked descriptors: |a| + |b| - 2 a.b
+        a_bits = np.unpackbits(a, axis=1).astype(np.float32)
+        b_bits = np.unpackbits(b, axis=1).astype(np.float32)
+        return a_bits.sum(1)[:, None] + b_bits.sum(1)[None, :] - 2 * a_bits @ b_bits.T
+    a = a.astype(np.float32)
+    b = b.astype(np.float32)
+    d2 = (a * a).sum(1)[:, None] + (b * b).sum(1)[None, :] - 2 * a @ b.T
+    return np.sqrt(np.maximum(d2, 0))
+
+def _knn_numpy(des1, des2):
+    dist = np.empty((len(des1), 2), dtype=np.float32)
+    idx = np.empty((len(des1), 2), dtype=np.int64)
+    for start in range(0, len(des1), knn_chunk):
+        d = _pairwise_numpy(des1[start:start + knn_chunk], des2)
+        nn = np.argpartition(d, 1, axis=1)[:, :2]
+        nd = np.take_along_axis(d, nn, axis=1)
+        order = np.argsort(nd, axis=1)
+        idx[start:start + knn_chunk] = np.take_along_axis(nn, order, axis=1)
+        dist[start:start + knn_chunk] = np.take_along_axis(nd, order, axis=1)
+    return dist, idx
+
+def _knn_torch(des1, des2):
+    import torch
+    with torch.inference_mode():
+        if des1.dtype == np.uint8:
+            a = torch.from_numpy(np.unpackbits(des1, axis=1)).float()
+            b = torch.from_numpy(np.unpackbits(des2, axis=1)).float()
+            d = a.sum(1, keepdim=True) + b.sum(1)[None, :] - 2 * a @ b.T
+        else:
+            d = torch.cdist(torch.from_numpy(des1).float(), torch.from_numpy(des2).float())
+        dist, idx = torch.topk(d, 2, dim=1, largest=False)
+    return dist.numpy().astype(np.float32), idx.numpy()
+
+MATCHER_ENGINES = {
+    "bf": _knn_bf,
+    "flann": _knn_flann,
+    "numpy": _knn_numpy,
+    "torch": _knn_torch,
+}
+
+def match_descriptors(pts1, des1, pts2, des2, engine="bf", return_scores=False):
+    # Matches come out best first (ascending distance). With return_scores the
+    # ratio-test margin 1 - d1/d2 is returned as a per-match confidence.
+    if engine not in MATCHER_ENGINES:
+        raise ValueError(f"Matcher engine must be one of {', '.join(MATCHER_ENGINES)}")
+    if des1 is None or des2 is None or len(des1) == 0 or len(des2) < 2:
+        empty = (np.zeros((0, 2), np.float32), np.zeros((0, 2), np.float32))
+        return empty + (np.zeros(0, np.float32),) if return_scores else empty
+
+    dist, idx = MATCHER_ENGINES[engine](des1, des2)
+
+    # Ratio test, top-k selection and point gathering as array operations
+    good = np.flatnonzero((idx[:, 1] >= 0) & (dist[:, 0] < ratio_thresh * dist[:, 1]))
+    # Stable sort keeps query order among equal (e.g. Hamming) distances
+    good = good[np.argsort(dist[good, 0], kind="stable")][:max_matches]
+
+    mkpts0 = pts1[good].astype(np.float32)
+    mkpts1 = pts2[idx[good, 0]].astype(np.float32)
+    if return_scores:
+        return mkpts0, mkpts1, np.float32(1 - dist[good, 0] / dist[good, 1])
+    return mkpts0, mkpts1
 
-    # Convert OpenCV images (BGR numpy) to torch tensors and normalize
-    # Kornia expects: [B, C, H, W] and values in [0, 1]
-    timg1 = K.image_to_tensor(img1, keepdim=False).float() / 255.0
-    timg2 = K.image_to_tensor(img2, keepdim=False).float() / 255.0
+def match_features_cv(img1, img2, detector, engine="bf", return_scores=False):
+    pts1, des1 = detect_features(img1, detector)
+    pts2, des2 = detect_features(img2, detector)
+    return match_descriptors(pts1, des1, pts2, des2, engine, return_scores)
 
-    # Convert from BGR → GRAY using Kornia
-    gray1 = K.color.bgr_to_grayscale(timg1)
-    gray2 = K.color.bgr_to_grayscale(timg2)
 
-    with torch.no_grad():
-        out = loftr({"image0": gray1, "image1": gray2})
+# LoFTR entry points, forwarded to the plugin so importing this module stays cheap
+def match_features_loftr(img1, img2, loftr, return_scores=False):
+    return load_plugin("LoFTR").match_features_loftr(img1, img2, loftr, return_scores)
 
-    # Extract keypoints and convert to numpy
-    mkpts0 = out["keypoints0"].cpu().numpy()
-    mkpts1 = out["keypoints1"].cpu().numpy()
-    return mkpts0, mkpts1
\ No newline at end of file
+def match_features_loftr_batch(pairs, loftr, max_dim=None, bucket=None, max_batch=None,
+                               return_scores=False):
+    return load_plugin("LoFTR").match_features_loftr_batch(pairs, loftr, max_dim, bucket,
+                                                            max_batch, return_scores)
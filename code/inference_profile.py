@@ -0,0 +1,180 @@
+import copy
+import time
+import argparse
+import contextlib
+
+import numpy as np
+
+# torch is imported inside the functions that need it so that reading
+# PROFILES (e.g. for CLI choices) stays cheap
+
+# LoFTR inference settings. Each profile may set:
+#   intra_threads / inter_threads - torch intra-op / inter-op pool sizes (None keeps the default)
+#   inference_mode - torch.inference_mode instead of no_grad
+#   channels_last  - NHWC memory layout for the CNN backbone
+#   bf16           - CPU autocast to bfloat16
+#   quantize       - dynamic int8 quantization of the transformer's nn.Linear layers
+#   compile        - torch.compile the model (first call pays the compile cost)
+DEFAULT_PROFILE = {
+    "intra_threads": None,
+    "inter_threads": None,
+    "inference_mode": True,
+    "channels_last": False,
+    "bf16": False,
+    "quantize": False,
+    "compile": False,
+}
+PROFILES = {
+    "fp32": {},
+    "channels_last": {"channels_last": True},
+    "bf16": {"bf16": True},
+    "qint8": {"quantize": True},
+    "compiled": {"compile": True},
+    "bf16_compiled": {"bf16": True, "compile": True},
+}
+
+
+def resolve_profile(profile):
+    # Accepts a profile name, a dict of overrides or None (fp32 baseline)
+    if profile is None:
+        profile = {}
+    elif isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown inference profile '{profile}', expected one of {list(PROFILES)}")
+        profile = PROFILES[profile]
+    unknown = set(profile) - set(DEFAULT_PROFILE)
+    if unknown:
+        raise ValueError(f"Unknown inference profile options: {sorted(unknown)}")
+    return {**DEFAULT_PROFILE, **profile}
+
+
+def set_threads(intra_threads=None, inter_threads=None):
+    import torch
+    if intra_threads:
+        torch.set_num_threads(intra_threads)
+    if inter_threads and torch.get_num_interop_threads() != inter_threads:
+        try:
+            torch.set_num_interop_threads(inter_threads)
+        except RuntimeError:
+            # Only settable once, before any inter-op parallel work has started
+            print(f"[WARN] inter-op threads already fixed at {torch.get_num_interop_threads()}")
+
+
+class ProfiledMatcher:
+    # Wraps a LoFTR module so every call runs under the profile's settings.
+    # Called exactly like the module: matcher({"image0": ..., "image1": ...}).
+    def __init__(self, model, profile=None):
+        import torch
+        self.profile = resolve_profile(profile)
+        set_threads(self.profile["intra_threads"], self.profile["inter_threads"])
+        model = model.eval()
+        if self.profile["quantize"]:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if self.profile["channels_last"]:
+            model = model.to(memory_format=torch.channels_last)
+        if self.profile["compile"]:
+            model = torch.compile(model, dynamic=True)
+        self.model = model
+
+    def _context(self):
+        import torch
+        stack = contextlib.ExitStack()
+        stack.enter_context(torch.inference_mode() if self.profile["inference_mode"]
+                            else torch.no_grad())
+        if self.profile["bf16"]:
+            stack.enter_context(torch.autocast("cpu", dtype=torch.bfloat16))
+        return stack
+
+    def __call__(self, data):
+        import torch
+        if self.profile["channels_last"]:
+            data = {k: v.contiguous(memory_format=torch.channels_last) if v.dim() == 4 else v
+                    for k, v in data.items()}
+        with self._context():
+            out = self.model(data)
+        # Downstream code expects fp32 keypoints whatever precision ran
+        return {k: v.float() if torch.is_tensor(v) and v.is_floating_point() else v
+                for k, v in out.items()}
+
+    def eval(self):
+        return self
+
+
+# ===============================
+# Benchmark mode
+# ===============================
+def keypoint_agreement(base0, base1, kpts0, kpts1, tol=2.0):
+    # Fraction of baseline matches reproduced (both endpoints within tol px)
+    if len(base0) == 0:
+        return 1.0 if len(kpts0) == 0 else 0.0
+    if len(kpts0) == 0:
+        return 0.0
+    d0 = np.linalg.norm(base0[:, None, :] - kpts0[None, :, :], axis=2)
+    d1 = np.linalg.norm(base1[:, None, :] - kpts1[None, :, :], axis=2)
+    return float(((d0 <= tol) & (d1 <= tol)).any(axis=1).mean())
+
+
+def benchmark_profiles(img1, img2, model, profiles, repeats=5, warmup=1, tol=2.0):
+    # Latency and agreement with the fp32 baseline for each profile.
+    # `model` is the unwrapped LoFTR module; each profile gets its own copy.
+    from feature_match import match_features_loftr
+
+    rows = []
+    baseline = None
+    for name in ["fp32"] + [p for p in profiles if p != "fp32"]:
+        matcher = ProfiledMatcher(copy.deepcopy(model), name)
+        for _ in range(warmup):
+            match_features_loftr(img1, img2, matcher)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            mkpts0, mkpts1 = match_features_loftr(img1, img2, matcher)
+            times.append(time.perf_counter() - start)
+        if baseline is None:
+            baseline = (mkpts0, mkpts1)
+        rows.append({
+            "profile": name,
+            "latency_ms": 1000 * float(np.median(times)),
+            "matches": len(mkpts0),
+            "agreement": keypoint_agreement(baseline[0], baseline[1], mkpts0, mkpts1, tol),
+        })
+    base_ms = rows[0]["latency_ms"]
+    for row in rows:
+        row["speedup"] = base_ms / row["latency_ms"]
+    return rows
+
+
+if __name__ == "__main__":
+    import cv2
+    import kornia.feature as KF
+
+    parser = argparse.ArgumentParser(description="Compare LoFTR inference profiles against fp32")
+    parser.add_argument("image1")
+    parser.add_argument("image2")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--intra-threads", type=int, default=None)
+    parser.add_argument("--inter-threads", type=int, default=None)
+    parser.add_argument("--max-dim", type=int, default=640,
+                        help="downscale the longest side to this many pixels")
+    parser.add_argument("--tol", type=float, default=2.0,
+                        help="pixel tolerance for a match to count as reproduced")
+    args = parser.parse_args()
+
+    set_threads(args.intra_threads, args.inter_threads)
+    images = []
+    for path in (args.image1, args.image2):
+        img = cv2.imread(path)
+        if img is None:
+            raise FileNotFoundError(f"Check image path: {path}")
+        scale = min(1.0, args.max_dim / max(img.shape[:2]))
+        # LoFTR needs sides divisible by 8
+        size = (int(img.shape[1] * scale) // 8 * 8, int(img.shape[0] * scale) // 8 * 8)
+        images.append(cv2.resize(img, size, interpolation=cv2.INTER_AREA))
+
+    loftr = KF.LoFTR(pretrained="outdoor").eval()
+    print(f"{'profile':<15}{'latency ms':>12}{'speedup':>9}{'matches':>9}{'agreement':>11}")
+    for row in benchmark_profiles(images[0], images[1], loftr, args.profiles, args.repeats,
+                                  tol=args.tol):
+        print(f"{row['profile']:<15}{row['latency_ms']:>12.1f}{row['speedup']:>9.2f}"
+              f"{row['matches']:>9}{row['agreement']:>11.3f}")
@@ -1,13 +1,122 @@
 import cv2
 import os
+import struct
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
-def load_images(path1, path2):
-    img1 = cv2.imread(path1)
-    img2 = cv2.imread(path2)
+# Largest first: JPEG decodes these with DCT scaling, far cheaper than a
+# full decode followed by a resize
+REDUCED_FLAGS = [(8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                 (2, cv2.IMREAD_REDUCED_COLOR_2)]
+
+# Decodes the two images of a pair side by side (cv2 releases the GIL);
+# created per process so forked workers never inherit a dead pool
+_decode_pool = None
+_decode_pool_pid = None
+
+def _get_decode_pool():
+    global _decode_pool, _decode_pool_pid
+    if _decode_pool is None or _decode_pool_pid != os.getpid():
+        _decode_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="decode")
+        _decode_pool_pid = os.getpid()
+    return _decode_pool
+
+def image_size(data):
+    # (height, width) from a PNG or JPEG header without decoding, else None
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return height, width
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if 0xD0 <= marker <= 0xD9 or marker == 0x01:
+            i += 2
+            continue
+        # SOF0..SOF15 except DHT, JPG and DAC carry the frame size
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return height, width
+        i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+def read_image_size(path):
+    # (height, width) of an image file, from its header when possible
+    with open(path, "rb") as f:
+        size = image_size(f.read())
+    if size is None:
+        img = cv2.imread(path)
+        size = img.shape[:2] if img is not None else None
+    return size
+
+def _decode(data, max_dim=None):
+    # With max_dim the longest side is brought down to at most max_dim: the
+    # largest IMREAD_REDUCED_* factor that stays above it, then a resize for
+    # the rest (INTER_AREA only when that is still a large reduction)
+    flags = cv2.IMREAD_COLOR
+    size = image_size(data) if max_dim else None
+    if size:
+        for factor, flag in REDUCED_FLAGS:
+            if max(size) / factor >= max_dim:
+                flags = flag
+                break
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if img is not None and max_dim and max(img.shape[:2]) > max_dim:
+        scale = max_dim / max(img.shape[:2])
+        interpolation = cv2.INTER_AREA if scale < 0.5 else cv2.INTER_LINEAR
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=interpolation)
+    return img
+
+def read_image(path, max_dim=None):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return _decode(data, max_dim)
+
+def load_images(path1, path2, max_dim=None):
+    # Both files are read and decoded concurrently; max_dim requests a
+    # downscaled decode (see _decode)
+    future = _get_decode_pool().submit(read_image, path2, max_dim)
+    img1 = read_image(path1, max_dim)
+    img2 = future.result()
     if img1 is None or img2 is None:
         raise FileNotFoundError("Check image paths!")
     return img1, img2
 
+def decode_image(data, max_dim=None):
+    # Decodes encoded image bytes (e.g. an upload) without touching disk
+    img = _decode(data, max_dim)
+    if img is None:
+        raise ValueError("Could not decode image data")
+    return img
+
+def decode_images(data1, data2, max_dim=None):
+    future = _get_decode_pool().submit(decode_image, data2, max_dim)
+    return decode_image(data1, max_dim), future.result()
+
+def encode_image(img, ext=".jpg", quality=95):
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext in (".jpg", ".jpeg") else []
+    ok, buf = cv2.imencode(ext, img, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {ext}")
+    return buf.tobytes()
+
 def save_image(path, img):
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    cv2.imwrite(path, img)
\ No newline at end of file
+    cv2.imwrite(path, img)
+
+def image_hash(img):
+    # Content hash of the decoded pixels (shape and dtype included)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.shape}:{img.dtype}".encode())
+    h.update(memoryview(np.ascontiguousarray(img)).cast("B"))
+    return h.hexdigest()
@@ -0,0 +1,326 @@
+import os
+import time
+import uuid
+import signal
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from io_utils import decode_images, encode_image
+
+JOB_STATES = ("queued", "running", "done", "failed", "timeout")
+
+# Per-process backend and start-notice queue, set once by the pool initializer
+_backend = None
+_started = None
+# How often the parent checks job deadlines, in seconds
+WATCHDOG_INTERVAL = 0.2
+# Times a job may be requeued after its pool was recycled under it
+MAX_REQUEUES = 2
+
+
+class QueueFull(Exception):
+    pass
+
+
+# ===============================
+# Worker side
+# ===============================
+def init_worker(max_models=1, warmup=(), loftr_profile=None, result_cache_dir=None,
+                result_cache_bytes=1 << 30, started=None):
+    global _backend, _started
+    _started = started
+    import feature_match
+    from backend import ImageAlignBackend
+    if loftr_profile:
+        feature_match.loftr_profile = loftr_profile
+    # Models are loaded once per worker and stay warm between jobs
+    _backend = ImageAlignBackend(max_models=max_models, warmup=list(warmup),
+                                 result_cache_dir=result_cache_dir,
+                                 result_cache_bytes=result_cache_bytes)
+
+
+def run_job(job_id, generation, fn, args):
+    # Tells the parent which process started the job and when, so the
+    # parent can enforce the deadline by killing this process. The result
+    # travels back with this worker's model / cache stats.
+    if _started is not None:
+        _started.put((job_id, generation, os.getpid(), time.time()))
+    result = fn(*args)
+    return result, os.getpid(), worker_stats() if _backend is not None else None
+
+
+def run_stitch_job(data1, data2, names, method, options, image_keys=()):
+    # Decode -> stitch -> encode entirely in the worker; only encoded JPEG
+    # bytes travel back to the web process
+    if _backend is None:
+        init_worker()
+    images = decode_images(data1, data2)
+    results = _backend.run_pipeline(names[0], names[1], method, images=images, **options)
+    if results["rejected"]:
+        return {"rejected": True, "alignment": results["alignment"],
+                "timings": results["timings"]}
+    arrays = dict(results["visualizations"], stitched=results["blended"])
+    start = time.perf_counter()
+    # Cache hits (and misses with the cache on) already carry the JPEG bytes
+    encoded = {key: results["encoded"].get(key) or encode_image(arrays[key])
+               for key in image_keys}
+    timings = results["timings"]
+    timings["encode"] += time.perf_counter() - start
+    return {
+        "rejected": False,
+        "alignment": results["alignment"],
+        "images": encoded,
+        "blend": results["blend"],
+        "timings": timings,
+        "cached": results["cached"],
+        "saved": ({key: results[key] for key in image_keys}
+                  if results["stitched"] is not None else None),
+    }
+
+
+def worker_stats():
+    return dict(_backend.models.stats(), feature_cache=_backend.features.stats(),
+                result_cache=_backend.results.stats() if _backend.results else None)
+
+
+# ===============================
+# Web process side
+# ===============================
+class JobQueue:
+    # Bounded local job queue: jobs run on a process pool whose workers keep
+    # their models warm. At most `max_pending` jobs may be queued or running;
+    # submit() raises QueueFull beyond that so the caller can push back.
+    # Finished jobs are kept for `result_ttl` seconds.
+    # Deadlines are enforced from this process: a watchdog thread kills the
+    # worker of a job that runs past `timeout` and recycles the pool, so no
+    # worker is ever reused after being interrupted mid-job. Jobs caught in
+    # a recycle that were not at fault are requeued on the fresh pool.
+
+    def __init__(self, workers=2, max_pending=8, timeout=120.0, max_models=1, warmup=(),
+                 result_ttl=600.0, loftr_profile=None, result_cache_dir=None,
+                 result_cache_bytes=1 << 30):
+        if workers < 1 or max_pending < 1:
+            raise ValueError("workers and max_pending must be at least 1")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self._initargs = (max_models, tuple(warmup), loftr_profile, result_cache_dir,
+                          result_cache_bytes)
+        self._pool = None
+        self._generation = 0
+        self._started = None
+        self._watchdog = None
+        self._closed = False
+        self._jobs = {}
+        self._worker_stats = {}  # pid -> latest stats pushed by that worker
+        # Reentrant: a future that is already done runs its callback inline
+        self._lock = threading.RLock()
+        self._counts = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "timeout": 0,
+                        "requeued": 0, "recycled": 0}
+
+    def _get_pool(self):
+        # Created on first use so importing the web app starts no processes
+        if self._pool is None:
+            if self._started is None:
+                # SimpleQueue writes synchronously, so a notice is not lost
+                # with a worker that dies right after starting its job
+                self._started = multiprocessing.SimpleQueue()
+                self._watchdog = threading.Thread(target=self._watch, name="job-watchdog",
+                                                  daemon=True)
+                self._watchdog.start()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                             initargs=self._initargs + (self._started,))
+        return self._pool
+
+    def _purge(self, now):
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished"] is not None and now - job["finished"] > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _pending(self):
+        return sum(1 for job in self._jobs.values() if job["finished"] is None)
+
+    def submit(self, fn, *args):
+        with self._lock:
+            now = time.time()
+            self._purge(now)
+            if self._pending() >= self.max_pending:
+                self._counts["rejected"] += 1
+                raise QueueFull(f"{self.max_pending} jobs already pending")
+            job_id = uuid.uuid4().hex
+            job = {"submitted": now, "finished": None, "state": "queued", "result": None,
+                   "error": None, "fn": fn, "args": args, "requeues": 0,
+                   "done": threading.Event()}
+            self._jobs[job_id] = job
+            self._counts["submitted"] += 1
+            self._dispatch(job_id, job)
+        return job_id
+
+    def _dispatch(self, job_id, job):
+        # (Re)submits a job to the current pool; callers hold the lock
+        job.update(generation=self._generation, pid=None, started=None)
+        future = self._get_pool().submit(run_job, job_id, self._generation, job["fn"], job["args"])
+        job["future"] = future
+        future.add_done_callback(lambda future: self._finish(job_id, job, future))
+
+    def _set_finished(self, job, state, result=None, error=None):
+        job["finished"] = time.time()
+        job["state"], job["result"], job["error"] = state, result, error
+        job["fn"] = job["args"] = None  # drop the uploaded bytes
+        self._counts[state] += 1
+        job["done"].set()
+
+    def _finish(self, job_id, job, future):
+        with self._lock:
+            # Futures of a recycled pool are superseded by the requeued job
+            if job["finished"] is not None or future is not job["future"]:
+                return
+            error = RuntimeError("job cancelled") if future.cancelled() else future.exception()
+            if error is None:
+                result, pid, stats = future.result()
+                if stats is not None:
+                    self._worker_stats[pid] = stats
+                self._set_finished(job, "done", result=result)
+            elif isinstance(error, BrokenProcessPool):
+                # A worker died (e.g. out of memory); whichever job it ran is unknown
+                self._recycle(job["generation"])
+            else:
+                self._set_finished(job, "failed", error=error)
+
+    def _recycle(self, generation, culprit=None):
+        # Replaces the pool of `generation` with a fresh one. Jobs that had
+        # started on it fail unless only `culprit` (a known job id) is to blame;
+        # jobs that had not started are requeued. Callers hold the lock.
+        if generation != self._generation or self._pool is None:
+            return
+        self._drain_started()
+        pool, self._pool = self._pool, None
+        self._generation += 1
+        self._worker_stats.clear()
+        self._counts["recycled"] += 1
+        for job_id, job in list(self._jobs.items()):
+            if job["finished"] is not None or job["generation"] != generation:
+                continue
+            # Requeues are capped so a job cannot recycle pools forever
+            if (culprit is None and job["started"] is not None) or job["requeues"] >= MAX_REQUEUES:
+                self._set_finished(job, "failed", error=BrokenProcessPool(
+                    "a worker process died while this job was queued or running"))
+            else:
+                job["requeues"] += 1
+                self._counts["requeued"] += 1
+                self._dispatch(job_id, job)
+        # The old futures now belong to nobody; shutting down also stops the
+        # pool's management thread once its processes are gone
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _drain_started(self):
+        while not self._started.empty():
+            job_id, generation, pid, started = self._started.get()
+            job = self._jobs.get(job_id)
+            if job is not None and job["finished"] is None and job["generation"] == generation:
+                job["pid"], job["started"] = pid, started
+
+    def _watch(self):
+        while not self._closed:
+            time.sleep(WATCHDOG_INTERVAL)
+            with self._lock:
+                if self._pool is None:
+                    continue
+                self._drain_started()
+                if not self.timeout:
+                    continue
+                now = time.time()
+                for job_id, job in list(self._jobs.items()):
+                    if (job["finished"] is None and job["started"] is not None
+                            and now - job["started"] > self.timeout):
+                        self._timeout(job_id, job)
+
+    def _timeout(self, job_id, job):
+        # The hung worker cannot be interrupted safely, so it is killed and
+        # the rest of its pool is recycled around it
+        self._set_finished(job, "timeout", error=f"job exceeded {self.timeout}s")
+        self._recycle(job["generation"], culprit=job_id)
+        try:
+            os.kill(job["pid"], signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def submit_stitch(self, data1, data2, names, method, options, image_keys):
+        return self.submit(run_stitch_job, data1, data2, tuple(names), method, dict(options),
+                           tuple(image_keys))
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            self._drain_started()
+            state = job["state"]
+            if state == "queued" and job["started"] is not None:
+                state = "running"
+            end = job["finished"] or time.time()
+            return {"job_id": job_id, "state": state, "elapsed": round(end - job["submitted"], 3)}
+
+    def result(self, job_id, wait=None):
+        # Returns (state, result, error); waits up to `wait` seconds if pending
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None, None, None
+        if wait:
+            job["done"].wait(wait)
+        with self._lock:
+            return job["state"], job["result"], job["error"]
+
+    def wait(self, job_id):
+        # Blocks until the job finishes, then forgets it; a job that outlives
+        # the wait is left to expire like any other
+        state, result, error = self.result(job_id, wait=(self.timeout or 0) + 30)
+        if state in ("done", "failed", "timeout"):
+            with self._lock:
+                self._jobs.pop(job_id, None)
+        return state, result, error
+
+    def stats(self):
+        with self._lock:
+            if self._started is not None:
+                self._drain_started()
+            states = {state: 0 for state in JOB_STATES}
+            for job in self._jobs.values():
+                state = job["state"]
+                if state == "queued" and job["started"] is not None:
+                    state = "running"
+                states[state] += 1
+            return dict(self._counts, workers=self.workers, max_pending=self.max_pending,
+                        timeout_s=self.timeout, pending=self._pending(), jobs=states)
+
+    def worker_stats(self):
+        # Latest stats of each live worker, as pushed with its last result,
+        # plus model registry totals; nothing is sent to the workers
+        with self._lock:
+            workers = {str(pid): stats for pid, stats in self._worker_stats.items()}
+        return {
+            "workers": workers,
+            "hits": sum(stats["hits"] for stats in workers.values()),
+            "misses": sum(stats["misses"] for stats in workers.values()),
+            "load_time": sum(stats["load_time"] for stats in workers.values()),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            if self._pool is None:
+                return
+            self._drain_started()
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            # Running jobs would otherwise keep their workers alive
+            for job in self._jobs.values():
+                if job["finished"] is None and job["pid"] is not None:
+                    try:
+                        os.kill(job["pid"], signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
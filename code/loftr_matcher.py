@@ -0,0 +1,118 @@
+import importlib.metadata
+
+import cv2
+import numpy as np
+
+import feature_match
+from inference_profile import ProfiledMatcher
+
+# LoFTR matcher plugin, imported by feature_match on first LoFTR use. torch and
+# kornia are only imported once a model is loaded or run, so matcher_config()
+# (used for cache keys) stays cheap.
+
+def load_matcher():
+    import kornia.feature as KF
+    return ProfiledMatcher(KF.LoFTR(pretrained='outdoor'), feature_match.loftr_profile)
+
+def matcher_config():
+    # Versioned from package metadata so cache keys never import torch
+    return f"LoFTR-{feature_match.loftr_profile}-kornia{importlib.metadata.version('kornia')}"
+
+def match_features_loftr(img1, img2, loftr, return_scores=False):
+    import torch
+    import kornia as K
+
+    # Convert OpenCV images (BGR numpy) to torch tensors and normalize
+    # Kornia expects: [B, C, H, W] and values in [0, 1]
+    timg1 = K.image_to_tensor(img1, keepdim=False).float() / 255.0
+    timg2 = K.image_to_tensor(img2, keepdim=False).float() / 255.0
+
+    # Convert from BGR → GRAY using Kornia
+    gray1 = K.color.bgr_to_grayscale(timg1)
+    gray2 = K.color.bgr_to_grayscale(timg2)
+
+    with torch.no_grad():
+        out = loftr({"image0": gray1, "image1": gray2})
+
+    # Extract keypoints and convert to numpy, most confident first
+    conf = out["confidence"].cpu().numpy()
+    order = np.argsort(-conf, kind="stable")
+    mkpts0 = out["keypoints0"].cpu().numpy()[order]
+    mkpts1 = out["keypoints1"].cpu().numpy()[order]
+    if return_scores:
+        return mkpts0, mkpts1, conf[order]
+    return mkpts0, mkpts1
+
+# ===============================
+# Batched LoFTR
+# ===============================
+loftr_bucket = 64      # padded shapes are rounded up to this multiple (LoFTR needs /8)
+loftr_max_batch = 8
+
+def _loftr_gray(img, max_dim=None):
+    # Same grey conversion as kornia's bgr_to_grayscale, done once in NumPy
+    gray = cv2.cvtColor(img.astype(np.float32) / 255.0, cv2.COLOR_BGR2GRAY)
+    scale = 1.0
+    if max_dim and max(gray.shape) > max_dim:
+        scale = max_dim / max(gray.shape)
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+def _bucket_shape(shape, bucket):
+    return (-(-shape[0] // bucket) * bucket, -(-shape[1] // bucket) * bucket)
+
+def match_features_loftr_batch(pairs, loftr, max_dim=None, bucket=None, max_batch=None,
+                               return_scores=False):
+    # Matches many (img1, img2) pairs with as few forward passes as possible:
+    # pairs are padded to common shape buckets (padding is masked out) and each
+    # bucket runs as one batch. Returns [(mkpts0, mkpts1), ...] in input order,
+    # each most confident first (plus confidences with return_scores).
+    import torch
+    bucket = bucket or loftr_bucket
+    max_batch = max_batch or loftr_max_batch
+
+    prepared = []
+    groups = {}
+    for i, (img1, img2) in enumerate(pairs):
+        g1, s1 = _loftr_gray(img1, max_dim)
+        g2, s2 = _loftr_gray(img2, max_dim)
+        prepared.append((g1, s1, g2, s2))
+        key = (_bucket_shape(g1.shape, bucket), _bucket_shape(g2.shape, bucket))
+        groups.setdefault(key, []).append(i)
+
+    results = [None] * len(pairs)
+    for (shape0, shape1), members in groups.items():
+        for start in range(0, len(members), max_batch):
+            chunk = members[start:start + max_batch]
+            n = len(chunk)
+            image0 = np.zeros((n, 1) + shape0, dtype=np.float32)
+            image1 = np.zeros((n, 1) + shape1, dtype=np.float32)
+            mask0 = np.zeros((n,) + shape0, dtype=np.float32)
+            mask1 = np.zeros((n,) + shape1, dtype=np.float32)
+            for b, i in enumerate(chunk):
+                g1, _, g2, _ = prepared[i]
+                image0[b, 0, :g1.shape[0], :g1.shape[1]] = g1
+                image1[b, 0, :g2.shape[0], :g2.shape[1]] = g2
+                mask0[b, :g1.shape[0], :g1.shape[1]] = 1
+                mask1[b, :g2.shape[0], :g2.shape[1]] = 1
+
+            data = {"image0": torch.from_numpy(image0), "image1": torch.from_numpy(image1)}
+            if not (mask0.all() and mask1.all()):
+                data["mask0"] = torch.from_numpy(mask0)
+                data["mask1"] = torch.from_numpy(mask1)
+            with torch.inference_mode():
+                out = loftr(data)
+
+            # Split the flat keypoint lists back out per pair
+            batch_indexes = out["batch_indexes"].cpu().numpy()
+            kpts0 = out["keypoints0"].cpu().numpy()
+            kpts1 = out["keypoints1"].cpu().numpy()
+            conf = out["confidence"].cpu().numpy()
+            for b, i in enumerate(chunk):
+                _, s1, _, s2 = prepared[i]
+                sel = np.flatnonzero(batch_indexes == b)
+                sel = sel[np.argsort(-conf[sel], kind="stable")]
+                results[i] = (np.float32(kpts0[sel] / s1), np.float32(kpts1[sel] / s2))
+                if return_scores:
+                    results[i] += (conf[sel],)
+    return results
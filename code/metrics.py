@@ -0,0 +1,175 @@
+import math
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# Metrics evaluate_pair can compute; callers pick any subset
+METRICS = ("ssim", "mse", "psnr", "sift_match_rate", "orb_match_rate")
+DEFAULT_METRICS = ("ssim", "mse", "psnr")
+SSIM_WINDOW = 7
+
+
+# ===============================
+# Shared buffers
+# ===============================
+def resize_to_match(img1, img2):
+    h, w = img1.shape[:2]
+    return cv2.resize(img2, (w, h), interpolation=cv2.INTER_AREA)
+
+
+def prepare_pair(img_ref, img_test, max_dim=None):
+    # Aligns the test image to the reference size once (optionally shrinking
+    # both so the longest side is at most max_dim) and shares the derived
+    # buffers between metrics
+    if img_test.shape[:2] != img_ref.shape[:2]:
+        img_test = resize_to_match(img_ref, img_test)
+    if max_dim and max(img_ref.shape[:2]) > max_dim:
+        scale = max_dim / max(img_ref.shape[:2])
+        size = (max(1, round(img_ref.shape[1] * scale)), max(1, round(img_ref.shape[0] * scale)))
+        img_ref = cv2.resize(img_ref, size, interpolation=cv2.INTER_AREA)
+        img_test = cv2.resize(img_test, size, interpolation=cv2.INTER_AREA)
+    return {
+        "ref": img_ref,
+        "test": img_test,
+        "gray_ref": cv2.cvtColor(img_ref, cv2.COLOR_BGR2GRAY),
+        "gray_test": cv2.cvtColor(img_test, cv2.COLOR_BGR2GRAY),
+    }
+
+
+# ===============================
+# MSE / PSNR / SSIM
+# ===============================
+def mse_from(buffers):
+    # Sum of squared differences in double precision, no float image copies
+    ref, test = buffers["ref"], buffers["test"]
+    return cv2.norm(ref, test, cv2.NORM_L2SQR) / ref.size
+
+
+def psnr_from_mse(mse):
+    if mse == 0:
+        return float("inf")
+    return 10 * math.log10((255.0 ** 2) / mse)
+
+
+def ssim_from(buffers, win_size=SSIM_WINDOW):
+    # Same definition as skimage.metrics.structural_similarity on uint8 grey
+    # images with its defaults (uniform win_size window, sample covariance,
+    # K1=0.01, K2=0.03, border of (win_size - 1) / 2 excluded)
+    x = buffers["gray_ref"].astype(np.float64)
+    y = buffers["gray_test"].astype(np.float64)
+    if min(x.shape) < win_size:
+        raise ValueError(f"Images must be at least {win_size}x{win_size} for SSIM")
+
+    def mean(img):
+        return cv2.boxFilter(img, cv2.CV_64F, (win_size, win_size), borderType=cv2.BORDER_REFLECT)
+
+    ux, uy = mean(x), mean(y)
+    cov_norm = win_size ** 2 / (win_size ** 2 - 1)
+    vx = cov_norm * (mean(x * x) - ux * ux)
+    vy = cov_norm * (mean(y * y) - uy * uy)
+    vxy = cov_norm * (mean(x * y) - ux * uy)
+
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    s = ((2 * ux * uy + c1) * (2 * vxy + c2)) / ((ux * ux + uy * uy + c1) * (vx + vy + c2))
+    pad = (win_size - 1) // 2
+    return float(s[pad:s.shape[0] - pad, pad:s.shape[1] - pad].mean())
+
+
+# ===============================
+# Feature match rates
+# ===============================
+def sift_match_rate_from(buffers):
+    sift = cv2.SIFT_create()
+    kp1, des1 = sift.detectAndCompute(buffers["gray_ref"], None)
+    kp2, des2 = sift.detectAndCompute(buffers["gray_test"], None)
+    if des1 is None or des2 is None or len(kp1) == 0:
+        return 0.0
+    matches = cv2.BFMatcher().knnMatch(des1, des2, k=2)
+    good = [m for m in matches if len(m) == 2 and m[0].distance < 0.75 * m[1].distance]
+    return len(good) / len(kp1)
+
+
+def orb_match_rate_from(buffers):
+    orb = cv2.ORB_create()
+    kp1, des1 = orb.detectAndCompute(buffers["gray_ref"], None)
+    kp2, des2 = orb.detectAndCompute(buffers["gray_test"], None)
+    if des1 is None or des2 is None or len(kp1) == 0:
+        return 0.0
+    matches = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True).match(des1, des2)
+    return sum(1 for m in matches if m.distance < 60) / len(kp1)
+
+
+# ===============================
+# Entry points
+# ===============================
+def evaluate_pair(img_ref, img_test, metrics=DEFAULT_METRICS, max_dim=None,
+                  ssim_window=SSIM_WINDOW):
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {sorted(unknown)}, expected some of {METRICS}")
+    buffers = prepare_pair(img_ref, img_test, max_dim)
+
+    result = {}
+    if "mse" in metrics or "psnr" in metrics:
+        mse = mse_from(buffers)
+        if "mse" in metrics:
+            result["mse"] = mse
+        if "psnr" in metrics:
+            result["psnr"] = psnr_from_mse(mse)
+    if "ssim" in metrics:
+        result["ssim"] = ssim_from(buffers, ssim_window)
+    if "sift_match_rate" in metrics:
+        result["sift_match_rate"] = sift_match_rate_from(buffers)
+    if "orb_match_rate" in metrics:
+        result["orb_match_rate"] = orb_match_rate_from(buffers)
+    return result
+
+
+def evaluate_paths(ref_path, test_path, metrics=DEFAULT_METRICS, max_dim=None,
+                   ssim_window=SSIM_WINDOW):
+    img_ref = cv2.imread(ref_path)
+    img_test = cv2.imread(test_path)
+    if img_ref is None or img_test is None:
+        raise ValueError(f"Could not read {ref_path} or {test_path}")
+    return evaluate_pair(img_ref, img_test, metrics, max_dim, ssim_window)
+
+
+def _evaluate_safe(paths, **options):
+    try:
+        return evaluate_paths(*paths, **options)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def evaluate_batch(path_pairs, metrics=DEFAULT_METRICS, max_dim=None, ssim_window=SSIM_WINDOW,
+                   workers=None):
+    # Evaluates [(ref_path, test_path), ...] on a process pool; returns one
+    # dict per pair in input order ({"error": ...} for pairs that failed)
+    fn = partial(_evaluate_safe, metrics=tuple(metrics), max_dim=max_dim,
+                 ssim_window=ssim_window)
+    if workers == 1 or len(path_pairs) <= 1:
+        return [fn(pair) for pair in path_pairs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, path_pairs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Similarity metrics between reference and test images")
+    parser.add_argument("pairs", nargs="+", help="reference/test paths, alternating")
+    parser.add_argument("--metrics", nargs="+", default=list(DEFAULT_METRICS), choices=METRICS)
+    parser.add_argument("--max-dim", type=int, default=None,
+                        help="downscale so the longest side is at most this many pixels")
+    parser.add_argument("--ssim-window", type=int, default=SSIM_WINDOW)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    if len(args.pairs) % 2:
+        parser.error("expected an even number of paths (reference, test, ...)")
+
+    pairs = list(zip(args.pairs[::2], args.pairs[1::2]))
+    for (ref, test), result in zip(pairs, evaluate_batch(pairs, args.metrics, args.max_dim,
+                                                         args.ssim_window, args.workers)):
+        print(f"{ref} vs {test}: " + ", ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}"
+                                               for k, v in result.items()))
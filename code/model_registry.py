@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+from feature_match import select_matcher
+
+
+class ModelRegistry:
+    # Keeps loaded detectors / matcher models resident between pipeline runs.
+    # Models load lazily on first use, at most `max_models` stay resident and
+    # the least recently used one is evicted when the limit is exceeded.
+
+    def __init__(self, max_models=3, loader=select_matcher):
+        if max_models < 1:
+            raise ValueError("max_models must be at least 1")
+        self.max_models = max_models
+        self.loader = loader
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._stats = {}
+
+    def _method_stats(self, method):
+        return self._stats.setdefault(method, {
+            "hits": 0,
+            "misses": 0,
+            "load_time": 0.0,
+            "evictions": 0,
+        })
+
+    def get(self, method):
+        with self._lock:
+            if method in self._models:
+                self._models.move_to_end(method)
+                self._method_stats(method)["hits"] += 1
+                return self._models[method]
+            load_lock = self._load_locks.setdefault(method, threading.Lock())
+
+        # Only one thread loads a given model; others wait for it here
+        with load_lock:
+            with self._lock:
+                if method in self._models:
+                    self._models.move_to_end(method)
+                    self._method_stats(method)["hits"] += 1
+                    return self._models[method]
+
+            start = time.perf_counter()
+            model = self.loader(method)
+            load_time = time.perf_counter() - start
+
+            with self._lock:
+                stats = self._method_stats(method)
+                stats["misses"] += 1
+                stats["load_time"] += load_time
+                self._models[method] = model
+                while len(self._models) > self.max_models:
+                    evicted, _ = self._models.popitem(last=False)
+                    self._method_stats(evicted)["evictions"] += 1
+            print(f"Loaded {method} in {load_time:.3f}s")
+            return model
+
+    def warmup(self, methods):
+        for method in methods:
+            self.get(method)
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
+
+    def stats(self):
+        with self._lock:
+            per_method = {m: dict(s) for m, s in self._stats.items()}
+            resident = list(self._models)
+        return {
+            "resident": resident,
+            "max_models": self.max_models,
+            "hits": sum(s["hits"] for s in per_method.values()),
+            "misses": sum(s["misses"] for s in per_method.values()),
+            "load_time": sum(s["load_time"] for s in per_method.values()),
+            "methods": per_method,
+        }
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+
+from alignment import find_homography, project_corners
+
+# Per-method (coarse, fine) limits on the longest image side, in pixels.
+# Coarse matching estimates the homography; fine matching refines it on the
+# predicted overlap window only. ORB is left out: its fixed feature budget
+# makes single-scale matching about as cheap as the coarse pass alone, so
+# two passes were slower on 3000 px pairs with no reliable accuracy gain.
+# It only runs coarse-to-fine when explicit limits are given.
+SCALE_LIMITS = {
+    "SIFT": (1200, 2400),
+    "LoFTR": (640, 1280),
+}
+MIN_MATCHES = 8
+WINDOW_MARGIN = 0.05
+
+
+def downscale(img, max_dim):
+    h, w = img.shape[:2]
+    scale = min(1.0, max_dim / max(h, w))
+    if scale == 1.0:
+        return img, 1.0
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+
+def _scaled_match(match, img1, img2, max_dim):
+    small1, s1 = downscale(img1, max_dim)
+    small2, s2 = downscale(img2, max_dim)
+    mkpts0, mkpts1 = match(small1, small2)
+    return mkpts0 / s1, mkpts1 / s2
+
+
+def _overlap_window(shape_dst, shape_src, H, margin):
+    # Bounding box in dst of src's projected footprint, clipped to dst
+    corners = project_corners(shape_src, H)
+    h, w = shape_dst[:2]
+    pad_x, pad_y = margin * w, margin * h
+    x0 = int(max(np.floor(corners[:, 0].min() - pad_x), 0))
+    y0 = int(max(np.floor(corners[:, 1].min() - pad_y), 0))
+    x1 = int(min(np.ceil(corners[:, 0].max() + pad_x), w))
+    y1 = int(min(np.ceil(corners[:, 1].max() + pad_y), h))
+    if x1 - x0 < 16 or y1 - y0 < 16:
+        return None
+    return x0, y0, x1, y1
+
+
+def match_multiscale(img1, img2, match, method, limits=None, min_matches=MIN_MATCHES,
+                     margin=WINDOW_MARGIN):
+    # `match(img_a, img_b) -> (mkpts0, mkpts1)` is any pair matcher; returned
+    # keypoints are always in full-resolution coordinates of img1 / img2.
+    # Methods without default limits are matched at a single scale.
+    limits = limits or SCALE_LIMITS.get(method)
+    if limits is None:
+        return match(img1, img2)
+    coarse_dim, fine_dim = limits
+
+    # Coarse pass on downscaled copies
+    coarse0, coarse1 = _scaled_match(match, img1, img2, coarse_dim)
+    coarse0 = np.float32(coarse0)
+    coarse1 = np.float32(coarse1)
+    if len(coarse0) < min_matches:
+        return coarse0, coarse1
+
+    H, _ = find_homography(coarse0, coarse1)
+    if H is None:
+        return coarse0, coarse1
+    try:
+        win1 = _overlap_window(img1.shape, img2.shape, H, margin)
+        win2 = _overlap_window(img2.shape, img1.shape, np.linalg.inv(H), margin)
+    except (ValueError, np.linalg.LinAlgError):
+        return coarse0, coarse1
+    if win1 is None or win2 is None:
+        return coarse0, coarse1
+
+    # Fine pass restricted to the predicted overlap windows
+    ax0, ay0, ax1, ay1 = win1
+    bx0, by0, bx1, by1 = win2
+    fine0, fine1 = _scaled_match(match, img1[ay0:ay1, ax0:ax1], img2[by0:by1, bx0:bx1], fine_dim)
+    if len(fine0) < min_matches:
+        return coarse0, coarse1
+
+    fine0 = np.float32(fine0 + np.array([ax0, ay0], dtype=np.float32))
+    fine1 = np.float32(fine1 + np.array([bx0, by0], dtype=np.float32))
+    return fine0, fine1
@@ -0,0 +1,216 @@
+import os
+import argparse
+from collections import deque
+
+import cv2
+import numpy as np
+
+from feature_match import detect_features, match_descriptors, match_features_loftr, MATCHER_ENGINES
+from alignment import find_homography, project_corners, MAX_CANVAS_PIXELS
+from blending import blend_images_inplace, FEATHER_KSIZE
+from timing import StageTimer
+
+MIN_INLIERS = 20
+
+
+# ===============================
+# Candidate pairs
+# ===============================
+def image_signature(img, size=64):
+    # Cheap global descriptor: a coarse HSV colour histogram of a thumbnail
+    thumb = cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1, 2], None, [8, 4, 4], [0, 180, 0, 256, 0, 256])
+    return cv2.normalize(hist, None).flatten()
+
+
+def candidate_pairs(images, k_neighbors=4, window=None):
+    # Only likely-overlapping pairs are matched: each image's k most similar
+    # images by signature, plus neighbours within `window` for ordered captures
+    n = len(images)
+    pairs = set()
+    if window:
+        pairs.update((i, j) for i in range(n) for j in range(i + 1, min(i + 1 + window, n)))
+    if k_neighbors:
+        sigs = np.stack([image_signature(img) for img in images])
+        sim = sigs @ sigs.T
+        np.fill_diagonal(sim, -np.inf)
+        for i in range(n):
+            for j in np.argsort(-sim[i])[:k_neighbors]:
+                pairs.add((min(i, int(j)), max(i, int(j))))
+    return sorted(pairs)
+
+
+# ===============================
+# Match graph
+# ===============================
+def build_match_graph(images, pairs, method, model, min_inliers=MIN_INLIERS, timer=None,
+                      detect=None, matcher_engine="bf"):
+    # Returns edges (i, j, inliers, H) where H maps image j into image i
+    timer = timer or StageTimer()
+    features = None
+    if method in ["SIFT", "ORB"]:
+        detect = detect or (lambda img: detect_features(img, model))
+        # Detect once per image, not once per pair
+        with timer.stage("detect"):
+            features = [detect(img) for img in images]
+
+    edges = []
+    for i, j in pairs:
+        with timer.stage("match"):
+            if features is not None:
+                (pts_i, des_i), (pts_j, des_j) = features[i], features[j]
+                mkpts_i, mkpts_j = match_descriptors(pts_i, des_i, pts_j, des_j, matcher_engine)
+            else:
+                mkpts_i, mkpts_j = match_features_loftr(images[i], images[j], model)
+        if len(mkpts_i) < 4:
+            continue
+        with timer.stage("homography"):
+            H, mask = find_homography(mkpts_i, mkpts_j)
+        if H is None:
+            continue
+        inliers = int(mask.sum())
+        if inliers >= min_inliers:
+            edges.append((i, j, inliers, H))
+    return edges
+
+
+def maximum_spanning_tree(n, edges):
+    # Kruskal on inlier counts; returns the kept edges
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    tree = []
+    for edge in sorted(edges, key=lambda e: e[2], reverse=True):
+        ri, rj = find(edge[0]), find(edge[1])
+        if ri != rj:
+            parent[ri] = rj
+            tree.append(edge)
+    return tree
+
+
+def chain_homographies(n, tree):
+    # Picks the reference as the tree centre (fewest hops to every frame) of
+    # the largest component and chains homographies outwards from it
+    adjacency = {i: [] for i in range(n)}
+    for i, j, _, H in tree:
+        adjacency[i].append((j, H))                 # j -> i
+        adjacency[j].append((i, np.linalg.inv(H)))  # i -> j
+
+    def bfs(root):
+        hops = {root: 0}
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            for nxt, _ in adjacency[node]:
+                if nxt not in hops:
+                    hops[nxt] = hops[node] + 1
+                    queue.append(nxt)
+        return hops
+
+    reach = {i: bfs(i) for i in range(n)}
+    reference = max(range(n), key=lambda i: (len(reach[i]), -max(reach[i].values())))
+
+    homographies = {reference: np.eye(3)}
+    order = [reference]
+    queue = deque([reference])
+    while queue:
+        node = queue.popleft()
+        for nxt, H in adjacency[node]:
+            if nxt not in homographies:
+                # H maps nxt into node's frame
+                homographies[nxt] = homographies[node] @ H
+                order.append(nxt)
+                queue.append(nxt)
+    return reference, order, homographies
+
+
+# ===============================
+# Incremental compositing
+# ===============================
+def composite(images, order, homographies, max_canvas_pixels=MAX_CANVAS_PIXELS, timer=None):
+    timer = timer or StageTimer()
+    boxes = {}
+    for idx in order:
+        corners = project_corners(images[idx].shape, homographies[idx])
+        boxes[idx] = (np.floor(corners.min(axis=0)).astype(np.int64),
+                      np.ceil(corners.max(axis=0)).astype(np.int64))
+
+    xmin, ymin = np.min([b[0] for b in boxes.values()], axis=0)
+    xmax, ymax = np.max([b[1] for b in boxes.values()], axis=0)
+    out_w, out_h = int(xmax - xmin), int(ymax - ymin)
+    if max_canvas_pixels and out_w * out_h > max_canvas_pixels:
+        raise ValueError(f"Degenerate homography chain: canvas {out_w}x{out_h} exceeds "
+                         f"{max_canvas_pixels} pixels")
+
+    canvas = np.zeros((out_h, out_w, 3), dtype=np.uint8)
+    pad = FEATHER_KSIZE // 2
+    for idx in order:
+        # Each frame is warped only into its own bounding box on the canvas,
+        # padded so the feather sees the same neighbourhood as a full warp
+        lo, hi = boxes[idx]
+        x0, y0 = max(int(lo[0] - xmin) - pad, 0), max(int(lo[1] - ymin) - pad, 0)
+        x1, y1 = min(int(hi[0] - xmin) + pad, out_w), min(int(hi[1] - ymin) + pad, out_h)
+        M = np.array([[1, 0, -xmin - x0], [0, 1, -ymin - y0], [0, 0, 1]],
+                     dtype=np.float64) @ homographies[idx]
+        with timer.stage("warp"):
+            warped = cv2.warpPerspective(images[idx], M, (x1 - x0, y1 - y0))
+        with timer.stage("blend"):
+            blend_images_inplace(canvas[y0:y1, x0:x1], warped)
+    return canvas
+
+
+def stitch_panorama(images, method, model, k_neighbors=4, window=None, min_inliers=MIN_INLIERS,
+                    max_canvas_pixels=MAX_CANVAS_PIXELS, timer=None, detect=None,
+                    matcher_engine="bf"):
+    if len(images) < 2:
+        raise ValueError("Need at least two images for a panorama")
+    timer = timer or StageTimer()
+
+    pairs = candidate_pairs(images, k_neighbors, window)
+    edges = build_match_graph(images, pairs, method, model, min_inliers, timer, detect,
+                              matcher_engine)
+    tree = maximum_spanning_tree(len(images), edges)
+    reference, order, homographies = chain_homographies(len(images), tree)
+    if len(order) < 2:
+        raise ValueError("No image pair has enough inliers to stitch")
+
+    panorama = composite(images, order, homographies, max_canvas_pixels, timer)
+    return panorama, {
+        "reference": reference,
+        "order": order,
+        "dropped": sorted(set(range(len(images))) - set(order)),
+        "pairs_matched": len(pairs),
+        "edges": [(i, j, inliers) for i, j, inliers, _ in tree],
+        "homographies": {idx: H.tolist() for idx, H in homographies.items()},
+        "canvas_size": (panorama.shape[1], panorama.shape[0]),
+    }
+
+
+if __name__ == "__main__":
+    from backend import ImageAlignBackend
+
+    parser = argparse.ArgumentParser(description="Stitch N overlapping images into one panorama")
+    parser.add_argument("images", nargs="+", help="image files, or a single directory")
+    parser.add_argument("--method", default="SIFT", choices=["SIFT", "ORB", "LoFTR"])
+    parser.add_argument("--k-neighbors", type=int, default=4)
+    parser.add_argument("--window", type=int, default=None,
+                        help="also match frames this many positions apart (ordered captures)")
+    parser.add_argument("--matcher-engine", default="bf", choices=list(MATCHER_ENGINES))
+    args = parser.parse_args()
+
+    paths = args.images
+    if len(paths) == 1 and os.path.isdir(paths[0]):
+        paths = sorted(os.path.join(paths[0], f) for f in os.listdir(paths[0])
+                       if os.path.splitext(f)[1].lower() in (".jpg", ".jpeg", ".png", ".tif"))
+
+    result = ImageAlignBackend().run_panorama(paths, args.method, k_neighbors=args.k_neighbors,
+                                              window=args.window,
+                                              matcher_engine=args.matcher_engine)
+    print(f"[SAVED] {result['stitched']} ({len(result['order'])}/{len(paths)} images, "
+          f"reference {paths[result['reference']]})")
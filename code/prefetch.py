@@ -0,0 +1,79 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _nbytes(result):
+    # Bytes held by a loaded item: arrays, or (nested) lists / tuples of them
+    if isinstance(result, (list, tuple)):
+        return sum(_nbytes(r) for r in result)
+    return getattr(result, "nbytes", 0)
+
+
+class PairPrefetcher:
+    # Loads items ahead of the consumer on a small thread pool so decoding
+    # overlaps with the work on the previous item. Iterating yields
+    # (item, loaded, wait) in input order, where `loaded` is load(item) or
+    # the exception it raised and `wait` is how long the consumer blocked.
+    # At most `depth` items are loaded ahead, and no new load starts while
+    # the finished-but-unconsumed items (plus in-flight ones, estimated from
+    # the last finished item) exceed `max_bytes`; one is always allowed.
+
+    def __init__(self, items, load, depth=2, max_bytes=512 << 20, workers=2):
+        if depth < 0 or workers < 1:
+            raise ValueError("depth must be >= 0 and workers >= 1")
+        self.items = list(items)
+        self.load = load
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._estimate = 0
+        self._stats = {"loaded": 0, "wait": 0.0, "peak_bytes": 0}
+
+    def _load(self, item):
+        result = self.load(item)
+        with self._lock:
+            self._estimate = _nbytes(result)
+        return result
+
+    def _buffered(self, pending):
+        total = 0
+        for _, future in pending:
+            if future.done() and not future.exception():
+                total += _nbytes(future.result())
+            else:
+                total += self._estimate
+        return total
+
+    def __iter__(self):
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+        pending = deque()
+        next_index = 0
+        try:
+            while pending or next_index < len(self.items):
+                # Top up: the item about to be consumed plus `depth` ahead
+                while (next_index < len(self.items) and len(pending) <= self.depth
+                       and (not pending or self._buffered(pending) < self.max_bytes)):
+                    item = self.items[next_index]
+                    pending.append((item, pool.submit(self._load, item)))
+                    next_index += 1
+                self._stats["peak_bytes"] = max(self._stats["peak_bytes"], self._buffered(pending))
+
+                item, future = pending.popleft()
+                start = time.perf_counter()
+                try:
+                    loaded = future.result()
+                except Exception as e:
+                    loaded = e
+                wait = time.perf_counter() - start
+                self._stats["loaded"] += 1
+                self._stats["wait"] += wait
+                yield item, loaded, wait
+        finally:
+            # Consumer stopped early: drop what has not started yet
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return dict(self._stats, depth=self.depth, max_bytes=self.max_bytes)
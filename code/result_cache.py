@@ -0,0 +1,104 @@
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+
+from io_utils import image_hash
+
+# Bump when a pipeline change alters stitched output for the same config
+CACHE_VERSION = 2
+
+
+def result_key(img1, img2, method, config):
+    # Content address of one stitch: both images' pixels, the method and
+    # every setting that changes the output
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"v{CACHE_VERSION}:{image_hash(img1)}:{image_hash(img2)}:{method}:".encode())
+    h.update(json.dumps(config, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    # On-disk cache of finished stitches. Each entry is one .npz holding the
+    # encoded stitched JPEG, the matched keypoints (to redraw visualizations)
+    # and JSON metadata (homography, inliers, timings, ...). Entries are
+    # evicted least recently used first (by mtime, refreshed on every hit)
+    # once the directory grows past `max_bytes`.
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = {
+                    "stitched": data["stitched"].tobytes(),
+                    "mkpts0": data["mkpts0"],
+                    "mkpts1": data["mkpts1"],
+                    "meta": json.loads(data["meta"].tobytes().decode()),
+                }
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            # Missing, truncated or foreign file: a miss, overwritten on put
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+        return entry
+
+    def put(self, key, stitched, mkpts0, mkpts1, meta):
+        # `stitched` is the encoded image (bytes); written then renamed so
+        # concurrent readers never see partial files
+        tmp_path = self._path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, stitched=np.frombuffer(stitched, dtype=np.uint8),
+                     mkpts0=np.float32(mkpts0), mkpts1=np.float32(mkpts1),
+                     meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8))
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npz"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            return dict(self._stats, entries=len(entries),
+                        bytes=sum(size for _, size, _ in entries), max_bytes=self.max_bytes)
@@ -1,10 +1,15 @@
 import os
 import base64
-import tempfile
 import threading
 import webbrowser
-from flask import Flask, request, jsonify, render_template
-from backend import ImageAlignBackend
+from flask import Flask, request, jsonify, render_template, url_for
+from job_queue import JobQueue, QueueFull
+from blending import BLENDERS
+from alignment import HOMOGRAPHY_ESTIMATORS
+from feature_match import MATCHER_ENGINES, matcher_methods
+from backend import AUTO_METHOD
+
+IMAGE_KEYS = ["stitched", "features1", "features2", "matches"]
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -14,14 +19,25 @@ app = Flask(
     static_folder=os.path.join(BASE_DIR, "static")
 )
 
-backend = ImageAlignBackend()
-
-
-def save_temp_file(data_bytes, filename):
-    path = os.path.join(tempfile.gettempdir(), filename)
-    with open(path, "wb") as f:
-        f.write(data_bytes)
-    return path
+# Comma separated list of methods each worker loads at startup, e.g. "SIFT,ORB,LoFTR"
+WARMUP_MODELS = [m for m in os.environ.get("WARMUP_MODELS", "").split(",") if m]
+MAX_MODELS = int(os.environ.get("MAX_MODELS", "3"))
+# LoFTR inference profile name, see inference_profile.PROFILES
+LOFTR_PROFILE = os.environ.get("LOFTR_PROFILE")
+# Stitch jobs run on a local process pool: JOB_WORKERS processes, at most
+# JOB_QUEUE_SIZE jobs queued or running, each cut off after JOB_TIMEOUT seconds
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "8"))
+JOB_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", "120"))
+RETRY_AFTER = 2
+# Finished stitches are served from this content-addressed cache; "" disables it
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", os.path.join("outputs", "result_cache"))
+RESULT_CACHE_MB = float(os.environ.get("RESULT_CACHE_MB", "1024"))
+
+jobs = JobQueue(workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, timeout=JOB_TIMEOUT,
+                max_models=MAX_MODELS, warmup=WARMUP_MODELS, loftr_profile=LOFTR_PROFILE,
+                result_cache_dir=RESULT_CACHE_DIR or None,
+                result_cache_bytes=int(RESULT_CACHE_MB * 1e6))
 
 
 @app.route("/")
@@ -29,27 +45,123 @@ def index():
     return render_template("index.html")
 
 
-@app.post("/api/run_pipeline")
-def run_pipeline():
+def submit_stitch():
+    # Validates the upload form and queues a stitch job.
+    # Returns (job_id, None) or (None, error response).
     if "img1" not in request.files or "img2" not in request.files:
-        return jsonify({"error": "Missing images"}), 400
+        return None, (jsonify({"error": "Missing images"}), 400)
 
     img1 = request.files["img1"]
     img2 = request.files["img2"]
     method = request.form.get("method", "SIFT")
+    if method != AUTO_METHOD and method not in matcher_methods():
+        return None, (jsonify({"error": f"Unknown method: {method}"}), 400)
+    blender = request.form.get("blender", "feather")
+    if blender not in BLENDERS:
+        return None, (jsonify({"error": f"Unknown blender: {blender}"}), 400)
+    matcher_engine = request.form.get("matcher_engine", "bf")
+    if matcher_engine not in MATCHER_ENGINES:
+        return None, (jsonify({"error": f"Unknown matcher engine: {matcher_engine}"}), 400)
+    estimator = request.form.get("estimator", "ransac")
+    if estimator not in HOMOGRAPHY_ESTIMATORS:
+        return None, (jsonify({"error": f"Unknown estimator: {estimator}"}), 400)
+
+    # Uploads are decoded in the worker straight from the request bytes;
+    # nothing touches disk unless the client opts in with save=1
+    options = {
+        "blender": blender,
+        "matcher_engine": matcher_engine,
+        "multiscale": request.form.get("multiscale") == "1",
+        "write_to_disk": request.form.get("save") == "1",
+        "estimator": {"estimator": estimator},
+        # Degenerate alignments are stitched and flagged unless the client opts in
+        "reject_degenerate": request.form.get("reject_degenerate") == "1",
+    }
+    # Optional thresholds for method=auto (see backend.CASCADE_DEFAULTS)
+    try:
+        cascade = {}
+        if request.form.get("min_inliers"):
+            cascade["min_inliers"] = int(request.form["min_inliers"])
+        if request.form.get("min_inlier_ratio"):
+            cascade["min_inlier_ratio"] = float(request.form["min_inlier_ratio"])
+    except ValueError:
+        return None, (jsonify({"error": "min_inliers / min_inlier_ratio must be numbers"}), 400)
+    if cascade:
+        options["cascade"] = cascade
+    try:
+        job_id = jobs.submit_stitch(img1.read(), img2.read(), (img1.filename, img2.filename),
+                                    method, options, IMAGE_KEYS)
+    except QueueFull as e:
+        response = jsonify({"error": f"Server busy: {e}"})
+        response.headers["Retry-After"] = str(RETRY_AFTER)
+        return None, (response, 429)
+    return job_id, None
+
+
+def job_response(state, result, error):
+    if state == "timeout":
+        return jsonify({"state": state, "error": error}), 504
+    if state == "failed":
+        # Bad input (undecodable image, degenerate homography, ...) vs. a crash
+        code = 422 if isinstance(error, ValueError) else 500
+        return jsonify({"state": state, "error": str(error)}), code
+    if state != "done":
+        return jsonify({"state": state}), 202
+    if result["rejected"]:
+        # Alignment too weak to stitch: nothing was warped or blended
+        return jsonify({"state": state, "error": result["alignment"]["reason"],
+                        "alignment": result["alignment"], "timings": result["timings"]}), 422
+
+    output = {"state": state, "timings": result["timings"], "blend": result["blend"],
+              "alignment": result["alignment"], "cached": result["cached"]}
+    for key, data in result["images"].items():
+        output[key] = f"data:image/jpeg;base64,{base64.b64encode(data).decode('ascii')}"
+    if result["saved"] is not None:
+        output["saved"] = result["saved"]
+    return jsonify(output)
 
-    path1 = save_temp_file(img1.read(), img1.filename)
-    path2 = save_temp_file(img2.read(), img2.filename)
 
-    results = backend.run_pipeline(path1, path2, method)
+@app.post("/api/jobs")
+def create_job():
+    job_id, error = submit_stitch()
+    if error is not None:
+        return error
+    return jsonify({
+        "job_id": job_id,
+        "status_url": url_for("job_status", job_id=job_id),
+        "result_url": url_for("job_result", job_id=job_id),
+    }), 202
 
-    output = {}
-    for key, filepath in results.items():
-        with open(filepath, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode("ascii")
-        output[key] = f"data:image/jpeg;base64,{encoded}"
 
-    return jsonify(output)
+@app.get("/api/jobs/<job_id>")
+def job_status(job_id):
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(status)
+
+
+@app.get("/api/jobs/<job_id>/result")
+def job_result(job_id):
+    state, result, error = jobs.result(job_id)
+    if state is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return job_response(state, result, error)
+
+
+@app.post("/api/run_pipeline")
+def run_pipeline():
+    # Synchronous form of /api/jobs: same queue and limits, waits for the result
+    job_id, error = submit_stitch()
+    if error is not None:
+        return error
+    return job_response(*jobs.wait(job_id))
+
+
+@app.get("/api/model_stats")
+def model_stats():
+    # Served from the stats workers push with each result: never queued
+    return jsonify({"queue": jobs.stats(), "workers": jobs.worker_stats()})
 
 
 def open_browser():
@@ -58,4 +170,4 @@ def open_browser():
 
 if __name__ == "__main__":
     threading.Timer(0.5, open_browser).start()
-    app.run(host="0.0.0.0", port=5050)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5050, threaded=True)
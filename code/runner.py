@@ -0,0 +1,497 @@
+import os
+import csv
+import time
+import argparse
+import cProfile
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+from backend import ImageAlignBackend, AUTO_METHOD, CASCADE_DEFAULTS, resolve_cascade
+from alignment import MAX_CANVAS_PIXELS, HOMOGRAPHY_ESTIMATORS, corner_error
+from blending import BLENDERS
+import feature_match
+from feature_match import MATCHER_ENGINES
+from inference_profile import PROFILES
+from timing import STAGES
+from io_utils import load_images, read_image_size
+from prefetch import PairPrefetcher
+
+FIELDNAMES = (["folder", "method", "blender", "blended_path", "cached", "total_time",
+               "blend_peak_mb", "tier", "estimator", "est_iterations", "inliers", "inlier_ratio",
+               "reproj_error", "corner_error", "degenerate", "degenerate_reason"]
+              + [f"time_{s}" for s in STAGES])
+METRIC_FIELDS = ["ssim", "mse", "psnr"]
+# Optional per-folder ground truth (cropper/synthetic.py writes it): the
+# homography mapping 02.* pixels onto 01.* pixels
+GROUND_TRUTH_FILE = "homography.txt"
+
+# Per-process backend, created once by the pool initializer
+_backend = None
+
+
+# ===============================
+# Find images
+# ===============================
+def find_image_pair(folder):
+    img1, img2 = None, None
+    for f in os.listdir(folder):
+        if f.startswith("01."):
+            img1 = os.path.join(folder, f)
+        elif f.startswith("02."):
+            img2 = os.path.join(folder, f)
+    return img1, img2
+
+
+def list_jobs(root_dir, methods, done=()):
+    # Method-major order so each worker mostly keeps the same model resident
+    jobs = []
+    for method in methods:
+        for subfolder in sorted(os.listdir(root_dir)):
+            folder_path = os.path.join(root_dir, subfolder)
+            if not os.path.isdir(folder_path):
+                continue
+            if (subfolder, method) in done:
+                print(f"[RESUME] {subfolder} ({method}) already in CSV")
+                continue
+            jobs.append((folder_path, method))
+    return jobs
+
+
+def read_header(csv_path):
+    with open(csv_path, newline="") as csvfile:
+        return next(csv.reader(csvfile), None)
+
+
+# Columns that identify a finished job; CSVs written before per-method rows
+# lack "method" and cannot be resumed
+RESUME_KEYS = ("folder", "method")
+
+
+def read_done(csv_path):
+    if not os.path.exists(csv_path):
+        return set()
+    with open(csv_path, newline="") as csvfile:
+        reader = csv.DictReader(csvfile)
+        if not set(RESUME_KEYS) <= set(reader.fieldnames or ()):
+            return set()
+        return {(row["folder"], row["method"]) for row in reader}
+
+
+# ===============================
+# Worker
+# ===============================
+def init_worker(num_threads=None, methods=(), max_canvas_pixels=MAX_CANVAS_PIXELS,
+                feature_cache_dir=None, loftr_profile=None, result_cache_dir=None,
+                result_cache_bytes=1 << 30, cascade=None):
+    global _backend
+    if loftr_profile:
+        feature_match.loftr_profile = loftr_profile
+    # Concrete models this worker can need: the auto cascade expands to its tiers
+    resident = {m for m in methods if m != AUTO_METHOD}
+    if AUTO_METHOD in methods:
+        resident.update(resolve_cascade(cascade)["tiers"])
+    if num_threads:
+        cv2.setNumThreads(num_threads)
+        if "LoFTR" in resident:
+            import torch
+            torch.set_num_threads(num_threads)
+    # A single resident model per worker keeps memory flat; with the auto
+    # cascade every tier (and any other swept method) stays resident instead
+    # of LoFTR being reloaded on each escalation
+    max_models = len(resident) if AUTO_METHOD in methods else 1
+    _backend = ImageAlignBackend(max_models=max_models, max_canvas_pixels=max_canvas_pixels,
+                                 feature_cache_dir=feature_cache_dir,
+                                 result_cache_dir=result_cache_dir,
+                                 result_cache_bytes=result_cache_bytes)
+
+
+def _job_settings(options):
+    return {
+        "artifacts": options.get("artifacts", "stitched"),
+        "blender": options.get("blender", "feather"),
+        "tiled": options.get("tiled", False),
+        "matcher_engine": options.get("matcher_engine", "bf"),
+        "multiscale": options.get("multiscale", False),
+        "estimator": options.get("estimator"),
+        "cascade": options.get("cascade"),
+        "load_max_dim": options.get("load_max_dim"),
+        "reject_degenerate": options.get("reject_degenerate", False),
+        # The benchmark reports blend_peak_mb, so it pays for tracemalloc
+        "trace_blend_memory": True,
+    }
+
+
+def _profiled(profile_dir, name, fn):
+    if not profile_dir:
+        return fn()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn()
+    finally:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+
+
+def ground_truth_error(folder_path, H, load_max_dim=None):
+    # Corner reprojection error against the folder's ground-truth homography,
+    # in full-resolution 01.* pixels; None without ground truth or estimate
+    gt_path = os.path.join(folder_path, GROUND_TRUTH_FILE)
+    if H is None or not os.path.exists(gt_path):
+        return None
+    shape1, shape2 = (read_image_size(p) for p in find_image_pair(folder_path))
+    H = np.asarray(H, dtype=np.float64)
+    if load_max_dim:
+        # H was estimated on downscaled decodes; lift it to full resolution
+        s1 = min(1.0, load_max_dim / max(shape1))
+        s2 = min(1.0, load_max_dim / max(shape2))
+        H = np.diag([1 / s1, 1 / s1, 1]) @ H @ np.diag([s2, s2, 1])
+    return corner_error(H, np.loadtxt(gt_path), shape2)
+
+
+def _finish_job(folder_path, method, result, total_time, options):
+    # Moves the stitched image next to the inputs and builds the CSV row
+    evaluate = options.get("evaluate")
+    subfolder = os.path.basename(folder_path)
+    if result is not None and result["rejected"]:
+        return {"folder": subfolder, "method": method,
+                "error": f"alignment rejected: {result['alignment']['reason']}"}
+    if result is None or not os.path.exists(result["stitched"]):
+        return {"folder": subfolder, "method": method, "error": "invalid stitched image"}
+
+    ext = os.path.splitext(result["stitched"])[1]
+    blended_path = os.path.join(folder_path, method + "blended_result" + ext)
+    os.replace(result["stitched"], blended_path)
+
+    row = {
+        "folder": subfolder,
+        "method": method,
+        "blender": result["blend"]["blender"],
+        "blended_path": blended_path,
+        "cached": result["cached"],
+        "total_time": round(total_time, 3),
+        "blend_peak_mb": (round(result["blend"]["peak_mb"], 1)
+                          if result["blend"]["peak_mb"] is not None else None),
+        # Matcher that produced the alignment (differs from method under "auto")
+        "tier": result["alignment"].get("tier", method),
+        "estimator": result["alignment"]["estimator"],
+        # Adaptive-RANSAC estimate from the inlier ratio, not a measured count
+        "est_iterations": result["alignment"]["est_iterations"],
+        "inliers": result["alignment"]["inliers"],
+        "inlier_ratio": round(result["alignment"]["inlier_ratio"], 4),
+        "reproj_error": (round(result["alignment"]["reproj_error"], 3)
+                         if result["alignment"]["reproj_error"] is not None else None),
+        # Weak alignments are stitched and flagged unless --reject-degenerate
+        "degenerate": result["alignment"]["degenerate"],
+        "degenerate_reason": result["alignment"]["reason"],
+    }
+    try:
+        error = ground_truth_error(folder_path, result["alignment"]["H"],
+                                   options.get("load_max_dim"))
+        row["corner_error"] = round(error, 3) if error is not None else None
+    except (OSError, ValueError) as e:
+        print(f"[WARN] {subfolder} ground truth unusable: {e}")
+    for stage, seconds in result["timings"].items():
+        row[f"time_{stage}"] = round(seconds, 4)
+    if evaluate is not None:
+        try:
+            row.update(evaluate(folder_path, blended_path))
+        except Exception as e:
+            return {"folder": subfolder, "method": method, "error": f"eval error: {e}"}
+    return row
+
+
+def load_task(task, max_dim=None):
+    # Prefetch loader: the decoded pair (None if missing, or the error) for
+    # every folder of a (folder_paths, method) task
+    loaded = []
+    for folder_path in task[0]:
+        img1_path, img2_path = find_image_pair(folder_path)
+        if img1_path is None or img2_path is None:
+            loaded.append(None)
+            continue
+        try:
+            loaded.append(load_images(img1_path, img2_path, max_dim))
+        except Exception as e:
+            loaded.append(e)
+    return loaded
+
+
+def run_job(folder_path, method, options=None, images=None, load_wait=0.0):
+    # `images` is an already loaded pair (see load_task); `load_wait` the time
+    # spent waiting for it, reported as the load stage
+    if _backend is None:
+        init_worker()
+    options = options or {}
+
+    subfolder = os.path.basename(folder_path)
+    img1_path, img2_path = find_image_pair(folder_path)
+    if img1_path is None or img2_path is None:
+        return {"folder": subfolder, "method": method, "error": "missing images"}
+    if isinstance(images, Exception):
+        return {"folder": subfolder, "method": method, "error": f"load error: {images}"}
+
+    output_dir = os.path.join(_backend.project_output_dir, subfolder)
+    start_time = time.perf_counter()
+    try:
+        # Diagnostic images are written in the background so they never delay a job
+        result = _profiled(options.get("profile_dir"), f"{subfolder}_{method.lower()}",
+                           lambda: _backend.run_pipeline(img1_path, img2_path, method,
+                                                         output_dir=output_dir,
+                                                         defer_visualization=True,
+                                                         images=images,
+                                                         **_job_settings(options)))
+    except Exception as e:
+        return {"folder": subfolder, "method": method, "error": f"pipeline error: {e}"}
+    total_time = time.perf_counter() - start_time + load_wait
+    result["timings"]["load"] += load_wait
+    return _finish_job(folder_path, method, result, total_time, options)
+
+
+def run_batch_job(folder_paths, method, options=None, images=None, load_wait=0.0):
+    # Several folders in one call so LoFTR can match them in a single batch;
+    # returns one row per folder. `images` / `load_wait` as in run_job, one
+    # entry per folder
+    if _backend is None:
+        init_worker()
+    options = options or {}
+    images = images or [None] * len(folder_paths)
+
+    rows = [None] * len(folder_paths)
+    jobs = []
+    for i, folder_path in enumerate(folder_paths):
+        img1_path, img2_path = find_image_pair(folder_path)
+        if img1_path is None or img2_path is None:
+            rows[i] = {"folder": os.path.basename(folder_path), "method": method,
+                       "error": "missing images"}
+        elif isinstance(images[i], Exception):
+            rows[i] = {"folder": os.path.basename(folder_path), "method": method,
+                       "error": f"load error: {images[i]}"}
+        else:
+            jobs.append((i, (img1_path, img2_path)))
+    if not jobs:
+        return rows
+
+    output_dirs = [os.path.join(_backend.project_output_dir, os.path.basename(folder_paths[i]))
+                   for i, _ in jobs]
+    first = os.path.basename(folder_paths[jobs[0][0]])
+    results = _profiled(options.get("profile_dir"), f"batch_{first}_{method.lower()}",
+                        lambda: _backend.run_batch([pair for _, pair in jobs], method,
+                                                   output_dirs,
+                                                   images=[images[i] for i, _ in jobs],
+                                                   defer_visualization=True,
+                                                   **_job_settings(options)))
+    for (i, _), result in zip(jobs, results):
+        if not isinstance(result, Exception):
+            result["timings"]["load"] += load_wait / len(jobs)
+        folder_path = folder_paths[i]
+        if isinstance(result, Exception):
+            rows[i] = {"folder": os.path.basename(folder_path), "method": method,
+                       "error": f"pipeline error: {result}"}
+        else:
+            # Per-pair wall time is not separable in a batch; report the sum of
+            # its stages, with the batched match charged evenly
+            total_time = sum(result["timings"].values())
+            rows[i] = _finish_job(folder_path, method, result, total_time, options)
+    return rows
+
+
+def batch_jobs(jobs, batch_size):
+    # Groups consecutive LoFTR jobs into chunks of batch_size; other methods
+    # gain nothing from batching and stay single
+    tasks = []
+    for folder_path, method in jobs:
+        last = tasks[-1] if tasks else None
+        if (batch_size > 1 and method == "LoFTR" and last and last[1] == method
+                and len(last[0]) < batch_size):
+            last[0].append(folder_path)
+        else:
+            tasks.append(([folder_path], method))
+    return tasks
+
+
+def run_task(folder_paths, method, options=None, images=None, load_wait=0.0):
+    if len(folder_paths) == 1:
+        return [run_job(folder_paths[0], method, options, images and images[0], load_wait)]
+    return run_batch_job(folder_paths, method, options, images, load_wait)
+
+
+# ===============================
+# Benchmark
+# ===============================
+def run_benchmark(root_dir, methods, workers=1, csv_path=None, resume=False, evaluate=None,
+                  profile_dir=None, artifacts="stitched", blender="feather", tiled=False,
+                  max_canvas_pixels=MAX_CANVAS_PIXELS, feature_cache_dir=None,
+                  matcher_engine="bf", multiscale=False, batch_size=1, loftr_profile=None,
+                  result_cache_dir=None, result_cache_bytes=1 << 30, estimator=None,
+                  metric_fields=None, cascade=None, load_max_dim=None, prefetch=2,
+                  prefetch_bytes=512 << 20, reject_degenerate=False):
+    if csv_path is None:
+        csv_path = os.path.join(root_dir, "_".join(methods) + "_benchmark_results.csv")
+
+    options = {"evaluate": evaluate, "profile_dir": profile_dir, "artifacts": artifacts,
+               "blender": blender, "tiled": tiled, "matcher_engine": matcher_engine,
+               "multiscale": multiscale, "estimator": estimator, "cascade": cascade,
+               "load_max_dim": load_max_dim, "reject_degenerate": reject_degenerate}
+    # metric_fields names the keys `evaluate` returns (default METRIC_FIELDS)
+    fieldnames = FIELDNAMES + (list(metric_fields or METRIC_FIELDS) if evaluate is not None else [])
+    if resume and os.path.exists(csv_path) and not set(RESUME_KEYS) <= set(read_header(csv_path) or ()):
+        # An old-format CSV is kept aside and the sweep starts over in a fresh one
+        legacy_path = csv_path + ".old"
+        os.replace(csv_path, legacy_path)
+        print(f"[WARN] {csv_path} has no {'/'.join(RESUME_KEYS)} columns and cannot be resumed; "
+              f"moved to {legacy_path}")
+    done = read_done(csv_path) if resume else set()
+    jobs = list_jobs(root_dir, methods, done)
+    tasks = batch_jobs(jobs, batch_size)
+    print(f"[BENCHMARK] {len(jobs)} jobs in {len(tasks)} task(s) on {workers} worker(s) -> {csv_path}")
+
+    append = resume and os.path.exists(csv_path)
+    if append:
+        # Keep the column layout of the CSV being resumed
+        fieldnames = read_header(csv_path) or fieldnames
+    with open(csv_path, "a" if append else "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction="ignore")
+        if not append:
+            writer.writeheader()
+
+        def record(row):
+            if "error" in row:
+                print(f"[SKIP] {row['folder']} ({row['method']}) due to {row['error']}")
+                return
+            print(f"[SAVED] {row['blended_path']} in {row['total_time']:.3f}s")
+            writer.writerow(row)
+            # Stream results so an interrupted sweep can be resumed
+            csvfile.flush()
+
+        if workers <= 1:
+            init_worker(methods=tuple(methods), max_canvas_pixels=max_canvas_pixels,
+                        feature_cache_dir=feature_cache_dir, loftr_profile=loftr_profile,
+                        result_cache_dir=result_cache_dir, result_cache_bytes=result_cache_bytes,
+                        cascade=cascade)
+            # The next `prefetch` tasks are decoded while the current one stitches
+            loader = PairPrefetcher(tasks, partial(load_task, max_dim=load_max_dim),
+                                    depth=prefetch, max_bytes=prefetch_bytes)
+            for (folder_paths, method), images, wait in loader:
+                names = ", ".join(os.path.basename(p) for p in folder_paths)
+                print(f"[PROCESSING] {names} ({method})")
+                if isinstance(images, Exception):
+                    images = [images] * len(folder_paths)
+                for row in run_task(folder_paths, method, options, images, wait):
+                    record(row)
+            stats = loader.stats()
+            print(f"[PREFETCH] waited {stats['wait']:.3f}s on decoding, "
+                  f"peak buffer {stats['peak_bytes'] / 1e6:.1f} MB")
+            if _backend is not None:
+                _backend.wait_for_artifacts()
+            return csv_path
+
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(num_threads, tuple(methods), max_canvas_pixels,
+                                           feature_cache_dir, loftr_profile, result_cache_dir,
+                                           result_cache_bytes, cascade)) as pool:
+            futures = [pool.submit(run_task, folder_paths, method, options)
+                       for folder_paths, method in tasks]
+            for future in as_completed(futures):
+                for row in future.result():
+                    record(row)
+
+    return csv_path
+
+
+def estimator_options(args):
+    return {"estimator": args.estimator, "max_iters": args.ransac_max_iters,
+            "confidence": args.ransac_confidence, "top_k": args.top_k}
+
+
+def cascade_options(args):
+    cascade = {"tiers": args.cascade_tiers, "min_inliers": args.cascade_min_inliers,
+               "min_inlier_ratio": args.cascade_min_ratio}
+    return {k: v for k, v in cascade.items() if v is not None}
+
+
+def build_arg_parser(default_root="../SEAGULL2016", default_methods=("ORB",)):
+    parser = argparse.ArgumentParser(description="Benchmark stitching methods over a dataset")
+    parser.add_argument("root", nargs="?", default=default_root,
+                        help="dataset root with one subfolder per image pair")
+    parser.add_argument("--methods", nargs="+", default=list(default_methods),
+                        choices=["SIFT", "ORB", "LoFTR", AUTO_METHOD],
+                        help="'auto' escalates ORB -> SIFT -> LoFTR until the alignment is good")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes")
+    parser.add_argument("--csv", dest="csv_path", default=None,
+                        help="output CSV (default: <root>/<methods>_benchmark_results.csv)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip (folder, method) rows already present in the CSV")
+    parser.add_argument("--profile-dir", default=None,
+                        help="write a cProfile dump per (folder, method) into this directory")
+    parser.add_argument("--artifacts", choices=["stitched", "all"], default="stitched",
+                        help="also write keypoint/match visualizations with 'all'")
+    parser.add_argument("--blender", choices=list(BLENDERS), default="feather")
+    parser.add_argument("--matcher-engine", choices=list(MATCHER_ENGINES), default="bf",
+                        help="descriptor matcher for SIFT/ORB (flann: KD-tree / LSH)")
+    parser.add_argument("--multiscale", action="store_true",
+                        help="match coarse-to-fine: downscaled homography, then overlap window "
+                             "(SIFT and LoFTR; ORB stays single-scale)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="match this many LoFTR pairs per forward pass")
+    parser.add_argument("--loftr-profile", choices=list(PROFILES), default=None,
+                        help="LoFTR inference precision / compile settings (default fp32)")
+    parser.add_argument("--estimator", choices=list(HOMOGRAPHY_ESTIMATORS), default="ransac",
+                        help="robust homography estimator (prosac uses the matchers' ranking)")
+    parser.add_argument("--ransac-max-iters", type=int, default=None)
+    parser.add_argument("--ransac-confidence", type=float, default=None)
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="estimate the homography from the k best-ranked matches only")
+    parser.add_argument("--cascade-tiers", nargs="+", choices=["SIFT", "ORB", "LoFTR"], default=None,
+                        help=f"matchers tried by 'auto', in order (default {CASCADE_DEFAULTS['tiers']})")
+    parser.add_argument("--cascade-min-inliers", type=int, default=None,
+                        help=f"inliers a tier needs to be accepted (default {CASCADE_DEFAULTS['min_inliers']})")
+    parser.add_argument("--cascade-min-ratio", type=float, default=None,
+                        help=f"inlier ratio a tier needs (default {CASCADE_DEFAULTS['min_inlier_ratio']})")
+    parser.add_argument("--reject-degenerate", action="store_true",
+                        help="skip pairs whose alignment fails the quality gate instead of "
+                             "stitching and flagging them")
+    parser.add_argument("--load-max-dim", type=int, default=None,
+                        help="decode inputs with the longest side capped (downscaled stitch)")
+    parser.add_argument("--prefetch", type=int, default=2,
+                        help="pairs decoded ahead of the current one (single-process runs)")
+    parser.add_argument("--prefetch-mb", type=float, default=512,
+                        help="memory budget for prefetched images")
+    parser.add_argument("--tiled", action="store_true",
+                        help="stream warp + feather blend tile by tile into a tiled TIFF")
+    parser.add_argument("--max-canvas-mp", type=float, default=MAX_CANVAS_PIXELS / 1e6,
+                        help="reject homographies whose canvas exceeds this many megapixels")
+    parser.add_argument("--feature-cache", dest="feature_cache_dir", default=None,
+                        help="directory for on-disk keypoint/descriptor cache shared by workers")
+    parser.add_argument("--result-cache", dest="result_cache_dir", default=None,
+                        help="directory of cached stitch results; identical reruns are served from it")
+    parser.add_argument("--result-cache-mb", type=float, default=1024,
+                        help="size limit of the result cache (least recently used evicted first)")
+    return parser
+
+
+def run_from_args(args, **kwargs):
+    # Runs the benchmark described by build_arg_parser() arguments; entry
+    # points pass what their own flags add (e.g. evaluate) as kwargs
+    return run_benchmark(args.root, args.methods, args.workers, args.csv_path, args.resume,
+                         profile_dir=args.profile_dir, artifacts=args.artifacts,
+                         blender=args.blender, tiled=args.tiled,
+                         max_canvas_pixels=int(args.max_canvas_mp * 1e6),
+                         feature_cache_dir=args.feature_cache_dir,
+                         matcher_engine=args.matcher_engine, multiscale=args.multiscale,
+                         batch_size=args.batch_size, loftr_profile=args.loftr_profile,
+                         result_cache_dir=args.result_cache_dir,
+                         result_cache_bytes=int(args.result_cache_mb * 1e6),
+                         estimator=estimator_options(args), cascade=cascade_options(args),
+                         load_max_dim=args.load_max_dim, prefetch=args.prefetch,
+                         prefetch_bytes=int(args.prefetch_mb * 1e6),
+                         reject_degenerate=args.reject_degenerate, **kwargs)
+
+
+if __name__ == "__main__":
+    run_from_args(build_arg_parser().parse_args())
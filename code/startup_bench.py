@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Cold-start cost per method: every scenario runs in a fresh interpreter and
+# reports how long importing the pipeline took, how long the first stitch
+# took (model load included) and the peak resident memory of the process.
+
+
+def _peak_rss_mb():
+    import resource
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+
+def run_scenario(method, path1, path2):
+    start = time.perf_counter()
+    from backend import ImageAlignBackend
+    import_time = time.perf_counter() - start
+    result = {"method": method, "import_s": import_time, "import_rss_mb": _peak_rss_mb()}
+
+    start = time.perf_counter()
+    try:
+        backend = ImageAlignBackend(max_models=1)
+        backend.run_pipeline(path1, path2, method, artifacts="none", write_to_disk=False,
+                             reject_degenerate=False)
+        result["first_stitch_s"] = time.perf_counter() - start
+    except Exception as e:
+        # e.g. LoFTR weights not downloadable; import cost is still reported
+        result["first_stitch_s"] = None
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["torch_loaded"] = "torch" in sys.modules
+    return result
+
+
+def measure(method, path1, path2):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", method, path1, path2]
+    out = subprocess.run(cmd, capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+    if out.returncode != 0 or not lines:
+        raise RuntimeError(f"{method} scenario failed:\n{out.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time and memory of a cold start per method")
+    parser.add_argument("image1")
+    parser.add_argument("image2")
+    parser.add_argument("--methods", nargs="+", default=["ORB", "SIFT", "LoFTR"])
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, os.path.abspath(args.image1),
+                                      os.path.abspath(args.image2))))
+        sys.exit(0)
+
+    path1, path2 = os.path.abspath(args.image1), os.path.abspath(args.image2)
+    print(f"{'method':<8}{'import s':>10}{'import MB':>11}{'stitch s':>10}{'peak MB':>9}{'torch':>7}")
+    for method in args.methods:
+        for _ in range(args.repeats):
+            row = measure(method, path1, path2)
+            stitch = f"{row['first_stitch_s']:.3f}" if row["first_stitch_s"] is not None else "n/a"
+            print(f"{method:<8}{row['import_s']:>10.3f}{row['import_rss_mb']:>11.1f}{stitch:>10}"
+                  f"{row['peak_rss_mb']:>9.1f}{str(row['torch_loaded']):>7}")
+            if "error" in row:
+                print(f"  [WARN] {row['error']}")
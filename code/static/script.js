@@ -2,6 +2,9 @@ let startTime = null;
 let timerInterval = null;
 let currentOutputs = null;
 
+// How often a queued job is polled for its result
+const POLL_INTERVAL_MS = 250;
+
 // Transparent 1x1 PNG to avoid Chrome broken image icons
 const EMPTY_IMAGE =
   "data:image/png;base64," +
@@ -60,6 +63,7 @@ async function run(event) {
   const img1 = document.getElementById('img1').files[0];
   const img2 = document.getElementById('img2').files[0];
   const method = document.getElementById('method').value;
+  const blender = document.getElementById('blender').value;
 
   if (!img1 || !img2) {
     alert("Please select both images!");
@@ -77,17 +81,39 @@ async function run(event) {
     formData.append("img1", img1);
     formData.append("img2", img2);
     formData.append("method", method);
+    formData.append("blender", blender);
 
-    appendStatus(`Running ${method} stitching...`);
-
-    const response = await fetch("/api/run_pipeline", {
+    // Queue the job, then poll until it finishes
+    const submit = await fetch("/api/jobs", {
       method: "POST",
       body: formData
     });
+    const job = await submit.json();
+    if (!submit.ok) {
+      throw new Error(job.error || `HTTP ${submit.status}`);
+    }
+
+    appendStatus(`Running ${method} stitching...`);
+
+    let response;
+    while (true) {
+      response = await fetch(job.result_url);
+      if (response.status !== 202) break;
+      await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL_MS));
+    }
 
     const outputs = await response.json();
+    if (!response.ok) {
+      throw new Error(outputs.error || `HTTP ${response.status}`);
+    }
     stopTimer();
 
+    if (outputs.alignment && outputs.alignment.tier) {
+      appendStatus(`Matched with ${outputs.alignment.tier}`);
+    }
+    if (outputs.alignment && outputs.alignment.degenerate) {
+      appendStatus(`⚠ Weak alignment: ${outputs.alignment.reason}`);
+    }
     appendStatus("Stitching complete!");
     currentOutputs = outputs;
 
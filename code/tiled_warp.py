@@ -0,0 +1,97 @@
+import os
+import cv2
+import numpy as np
+import tifffile
+
+from alignment import compute_canvas, MAX_CANVAS_PIXELS
+from blending import blend_images_inplace, FEATHER_KSIZE
+
+# TIFF tiles must be a multiple of 16 pixels
+TILE_SIZE = 1024
+
+
+def _translation(tx, ty):
+    return np.array([[1, 0, tx], [0, 1, ty], [0, 0, 1]], dtype=np.float64)
+
+
+def _render_tile(img1, img2, M, x_off, y_off, box, warped_box, out_size):
+    # Renders canvas region box = (x0, y0, x1, y1) plus a blur halo and
+    # returns exactly that region; pixels match the full-canvas warp + feather
+    # up to interpolation rounding.
+    x0, y0, x1, y1 = box
+    out_w, out_h = out_size
+    pad = FEATHER_KSIZE // 2
+    hx0, hy0 = max(x0 - pad, 0), max(y0 - pad, 0)
+    hx1, hy1 = min(x1 + pad, out_w), min(y1 + pad, out_h)
+
+    # img1 is placed unwarped at (x_off, y_off)
+    base = np.zeros((hy1 - hy0, hx1 - hx0, 3), dtype=np.uint8)
+    h1, w1 = img1.shape[:2]
+    ix0, iy0 = max(hx0, x_off), max(hy0, y_off)
+    ix1, iy1 = min(hx1, x_off + w1), min(hy1, y_off + h1)
+    if ix0 < ix1 and iy0 < iy1:
+        base[iy0 - hy0:iy1 - hy0, ix0 - hx0:ix1 - hx0] = img1[iy0 - y_off:iy1 - y_off,
+                                                               ix0 - x_off:ix1 - x_off]
+
+    # img2 only needs warping where its footprint touches this tile
+    wx0, wy0, wx1, wy1 = warped_box
+    if wx0 < hx1 and hx0 < wx1 and wy0 < hy1 and hy0 < wy1:
+        # Per-tile inverse homography: tile pixel -> img2 pixel
+        tile_inv = np.linalg.inv(_translation(-hx0, -hy0) @ M)
+        warped = cv2.warpPerspective(img2, tile_inv, (hx1 - hx0, hy1 - hy0),
+                                     flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP)
+        blend_images_inplace(base, warped)
+
+    return base[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+
+
+def warp_blend_tiled(img1, img2, H, out_path, tile_size=TILE_SIZE,
+                     max_canvas_pixels=MAX_CANVAS_PIXELS):
+    # Warps img2 onto img1's plane and feather-blends tile by tile, streaming
+    # tiles to `out_path` so the full canvas never has to fit in memory.
+    #   *.tif / *.tiff -> tiled TIFF written from a tile generator
+    #   *.npy          -> memory-mapped array filled tile by tile
+    if tile_size % 16:
+        raise ValueError("tile_size must be a multiple of 16")
+
+    T, out_w, out_h = compute_canvas(img1.shape, img2.shape, H, max_canvas_pixels)
+    M = T @ H
+    x_off, y_off = int(T[0, 2]), int(T[1, 2])
+
+    h2, w2 = img2.shape[:2]
+    corners = np.array([[0, 0], [w2, 0], [w2, h2], [0, h2]], dtype=np.float64)
+    projected = cv2.perspectiveTransform(corners.reshape(-1, 1, 2), M).reshape(-1, 2)
+    warped_box = (int(np.floor(projected[:, 0].min())) - 1, int(np.floor(projected[:, 1].min())) - 1,
+                  int(np.ceil(projected[:, 0].max())) + 1, int(np.ceil(projected[:, 1].max())) + 1)
+
+    boxes = [(tx, ty, min(tx + tile_size, out_w), min(ty + tile_size, out_h))
+             for ty in range(0, out_h, tile_size)
+             for tx in range(0, out_w, tile_size)]
+
+    def render(box):
+        return _render_tile(img1, img2, M, x_off, y_off, box, warped_box, (out_w, out_h))
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    ext = os.path.splitext(out_path)[1].lower()
+    if ext in (".tif", ".tiff"):
+        def tiles():
+            for box in boxes:
+                tile = np.zeros((tile_size, tile_size, 3), dtype=np.uint8)
+                region = render(box)
+                # TIFF stores RGB; edge tiles are zero padded to full size
+                tile[:region.shape[0], :region.shape[1]] = region[:, :, ::-1]
+                yield tile
+
+        tifffile.imwrite(out_path, tiles(), shape=(out_h, out_w, 3), dtype=np.uint8,
+                         tile=(tile_size, tile_size), photometric="rgb")
+    elif ext == ".npy":
+        canvas = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.uint8,
+                                           shape=(out_h, out_w, 3))
+        for x0, y0, x1, y1 in boxes:
+            canvas[y0:y1, x0:x1] = render((x0, y0, x1, y1))
+        canvas.flush()
+        del canvas
+    else:
+        raise ValueError("Tiled output must be a .tif/.tiff or .npy file")
+
+    return out_path, (out_w, out_h)
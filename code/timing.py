@@ -0,0 +1,32 @@
+import time
+from contextlib import contextmanager
+
+# Pipeline stages in execution order; every result reports all of them
+STAGES = ["load", "cache", "detect", "match", "homography", "warp", "blend", "visualize", "encode"]
+
+
+class StageTimer:
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Accumulate so a stage may be entered more than once per run
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def add(self, name, seconds):
+        # For time measured elsewhere, e.g. a share of a batched stage
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def total(self):
+        return sum(self.timings.values())
+
+    def as_dict(self):
+        out = {stage: self.timings.get(stage, 0.0) for stage in STAGES}
+        for stage, value in self.timings.items():
+            out.setdefault(stage, value)
+        return out
@@ -0,0 +1,322 @@
+import os
+import argparse
+
+import cv2
+import numpy as np
+
+from io_utils import read_image
+from multiscale import downscale
+from feature_match import detect_features, match_descriptors, MATCHER_ENGINES
+from alignment import find_homography, project_corners
+from blending import blend_images_inplace, FEATHER_KSIZE
+from timing import StageTimer
+
+FRAME_EXTS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
+MIN_INLIERS = 20
+# A tracked frame becomes the next keyframe once less than this fraction of
+# it still lies inside the current keyframe; frames above it are redundant
+KEYFRAME_OVERLAP = 0.6
+# Matches must land within this many pixels of the motion model's prediction
+SEARCH_RADIUS = 40
+# Consecutive untrackable frames tolerated before the segment is closed
+MAX_LOST = 5
+# Streaming segments are flushed well before the two-image canvas limit
+STREAM_MAX_CANVAS_PIXELS = 50_000_000
+
+
+# ===============================
+# Frame sources
+# ===============================
+def iter_frames(source, step=1, max_dim=None):
+    # Yields (index, frame) lazily from a video file or a directory of
+    # frames (sorted by name); only every `step`-th frame is decoded
+    if os.path.isdir(source):
+        names = sorted(f for f in os.listdir(source) if os.path.splitext(f)[1].lower() in FRAME_EXTS)
+        for index in range(0, len(names), step):
+            frame = read_image(os.path.join(source, names[index]), max_dim)
+            if frame is None:
+                raise FileNotFoundError(f"Check frame: {names[index]}")
+            yield index, frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Could not open video: {source}")
+    try:
+        index = 0
+        while True:
+            if index % step:
+                # Skipped frames are demuxed but never decoded
+                if not capture.grab():
+                    break
+            else:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                yield index, (downscale(frame, max_dim)[0] if max_dim else frame)
+            index += 1
+    finally:
+        capture.release()
+
+
+# ===============================
+# Tracking
+# ===============================
+def overlap_fraction(H, shape_src, shape_dst, grid=16):
+    # Fraction of a grid over the source frame that H maps inside the destination frame
+    h, w = shape_src[:2]
+    xs, ys = np.meshgrid(np.linspace(0, w, grid), np.linspace(0, h, grid))
+    pts = np.stack([xs.ravel(), ys.ravel()], axis=1).reshape(-1, 1, 2)
+    mapped = cv2.perspectiveTransform(pts, H).reshape(-1, 2)
+    hd, wd = shape_dst[:2]
+    inside = (mapped[:, 0] >= 0) & (mapped[:, 0] <= wd) & (mapped[:, 1] >= 0) & (mapped[:, 1] <= hd)
+    return float(inside.mean())
+
+
+def _inside(pts, H, shape, margin):
+    mapped = cv2.perspectiveTransform(pts.reshape(-1, 1, 2).astype(np.float64), H).reshape(-1, 2)
+    h, w = shape[:2]
+    keep = ((mapped[:, 0] >= -margin) & (mapped[:, 0] <= w + margin)
+            & (mapped[:, 1] >= -margin) & (mapped[:, 1] <= h + margin))
+    return keep, mapped
+
+
+def guided_match(key_features, frame_features, key_shape, frame_shape, H_pred=None,
+                 radius=SEARCH_RADIUS, engine="bf"):
+    # Matches a frame against the keyframe. With a predicted homography
+    # (frame -> keyframe) only keypoints the prediction places inside the
+    # other image take part, and matches that land more than `radius` px
+    # from their predicted position are dropped.
+    # Returns (mkpts_key, mkpts_frame).
+    (pts_k, des_k), (pts_f, des_f) = key_features, frame_features
+    if H_pred is None or len(pts_k) == 0 or len(pts_f) == 0:
+        return match_descriptors(pts_k, des_k, pts_f, des_f, engine)
+
+    keep_f, _ = _inside(pts_f, H_pred, key_shape, radius)
+    keep_k, _ = _inside(pts_k, np.linalg.inv(H_pred), frame_shape, radius)
+    if keep_f.sum() < 2 or keep_k.sum() < 2:
+        return np.zeros((0, 2), np.float32), np.zeros((0, 2), np.float32)
+    mkpts_k, mkpts_f = match_descriptors(pts_k[keep_k], des_k[keep_k], pts_f[keep_f],
+                                         des_f[keep_f], engine)
+    if len(mkpts_f) == 0:
+        return mkpts_k, mkpts_f
+    predicted = cv2.perspectiveTransform(mkpts_f.reshape(-1, 1, 2).astype(np.float64),
+                                         H_pred).reshape(-1, 2)
+    close = np.linalg.norm(predicted - mkpts_k, axis=1) <= radius
+    return mkpts_k[close], mkpts_f[close]
+
+
+# ===============================
+# Growing canvas
+# ===============================
+class GrowingCanvas:
+    # Panorama canvas in the coordinates of a segment's first keyframe.
+    # It grows geometrically towards wherever keyframes land, so appending
+    # a frame costs one warp of that frame plus an occasional copy. fits()
+    # tells the caller when a frame would push it past `max_pixels`.
+
+    def __init__(self, max_pixels=STREAM_MAX_CANVAS_PIXELS, growth=0.5):
+        self.max_pixels = max_pixels
+        self.growth = growth
+        self.canvas = None
+        self.origin = np.zeros(2, dtype=np.int64)  # world coords of canvas[0, 0]
+        self.painted = None                         # world bbox actually drawn on
+
+    @staticmethod
+    def _bbox(shape, H):
+        corners = project_corners(shape, H)
+        return (np.floor(corners.min(axis=0)).astype(np.int64),
+                np.ceil(corners.max(axis=0)).astype(np.int64))
+
+    def fits(self, shape, H):
+        lo, hi = self._bbox(shape, H)
+        if self.painted is not None:
+            lo, hi = np.minimum(lo, self.painted[0]), np.maximum(hi, self.painted[1])
+        w, h = hi - lo
+        return int(w) * int(h) <= self.max_pixels
+
+    def _grow(self, lo, hi):
+        if self.canvas is None:
+            self.origin = lo
+            self.canvas = np.zeros((int(hi[1] - lo[1]), int(hi[0] - lo[0]), 3), dtype=np.uint8)
+            return
+        size = np.array([self.canvas.shape[1], self.canvas.shape[0]], dtype=np.int64)
+        cur_lo, cur_hi = self.origin, self.origin + size
+        if np.all(lo >= cur_lo) and np.all(hi <= cur_hi):
+            return
+        # Extend each side that overflows by at least `growth` of the current size
+        extra = (size * self.growth).astype(np.int64)
+        new_lo = np.where(lo < cur_lo, np.minimum(lo, cur_lo - extra), cur_lo)
+        new_hi = np.where(hi > cur_hi, np.maximum(hi, cur_hi + extra), cur_hi)
+        if int(np.prod(new_hi - new_lo)) > self.max_pixels:
+            # Geometric slack would overshoot the budget; grow just enough
+            new_lo, new_hi = np.minimum(lo, cur_lo), np.maximum(hi, cur_hi)
+        canvas = np.zeros((int(new_hi[1] - new_lo[1]), int(new_hi[0] - new_lo[0]), 3), dtype=np.uint8)
+        ox, oy = cur_lo - new_lo
+        canvas[oy:oy + self.canvas.shape[0], ox:ox + self.canvas.shape[1]] = self.canvas
+        self.canvas, self.origin = canvas, new_lo
+
+    def add(self, frame, H, timer=None):
+        timer = timer or StageTimer()
+        lo, hi = self._bbox(frame.shape, H)
+        self._grow(lo, hi)
+        self.painted = (lo, hi) if self.painted is None else (np.minimum(lo, self.painted[0]),
+                                                              np.maximum(hi, self.painted[1]))
+        # Warp only into the frame's padded bounding box, as panorama.composite does
+        pad = FEATHER_KSIZE // 2
+        out_h, out_w = self.canvas.shape[:2]
+        x0, y0 = max(int(lo[0] - self.origin[0]) - pad, 0), max(int(lo[1] - self.origin[1]) - pad, 0)
+        x1 = min(int(hi[0] - self.origin[0]) + pad, out_w)
+        y1 = min(int(hi[1] - self.origin[1]) + pad, out_h)
+        M = np.array([[1, 0, -self.origin[0] - x0], [0, 1, -self.origin[1] - y0], [0, 0, 1]],
+                     dtype=np.float64) @ H
+        with timer.stage("warp"):
+            warped = cv2.warpPerspective(frame, M, (x1 - x0, y1 - y0))
+        with timer.stage("blend"):
+            blend_images_inplace(self.canvas[y0:y1, x0:x1], warped)
+
+    def panorama(self):
+        lo, hi = self.painted
+        (x0, y0), (x1, y1) = lo - self.origin, hi - self.origin
+        return self.canvas[y0:y1, x0:x1]
+
+
+# ===============================
+# Streaming stitcher
+# ===============================
+def stitch_stream(frames, detector, matcher_engine="bf", keyframe_overlap=KEYFRAME_OVERLAP,
+                  min_inliers=MIN_INLIERS, radius=SEARCH_RADIUS, max_lost=MAX_LOST,
+                  max_canvas_pixels=STREAM_MAX_CANVAS_PIXELS, timer=None, detect=None, stats=None):
+    # Consumes (index, frame) pairs (see iter_frames) and yields finished
+    # segments as dicts with the panorama and the keyframe indices it holds.
+    # Each frame is detected once and tracked against the current keyframe,
+    # with a constant-velocity prediction narrowing the match search. Only the
+    # keyframe, the motion model and the canvas are kept, so memory stays
+    # bounded however long the sequence runs: a segment is flushed when its
+    # canvas would exceed max_canvas_pixels or tracking is lost. Counters
+    # are accumulated into `stats` when a dict is given.
+    timer = timer or StageTimer()
+    detect = detect or (lambda img: detect_features(img, detector))
+    stats = stats if stats is not None else {}
+    for name in ("frames", "keyframes", "skipped", "lost", "relocalized", "segments"):
+        stats.setdefault(name, 0)
+    segment = None
+
+    def start_segment(index, frame, features):
+        canvas = GrowingCanvas(max_canvas_pixels)
+        canvas.add(frame, np.eye(3), timer)
+        stats["keyframes"] += 1
+        return {"canvas": canvas, "keyframes": [index], "first": index, "last": index,
+                "key": {"index": index, "shape": frame.shape, "features": features, "G": np.eye(3)},
+                "pending": None, "R": np.eye(3), "motion": None, "lost": 0}
+
+    def finish_segment(seg):
+        # The last tracked frame closes the segment so the sweep's end is covered
+        if seg["pending"] is not None:
+            index, frame, features, R = seg["pending"]
+            try:
+                if seg["canvas"].fits(frame.shape, seg["key"]["G"] @ R):
+                    add_keyframe(seg, index, frame, features, R)
+            except ValueError:
+                pass
+        stats["segments"] += 1
+        return {"panorama": seg["canvas"].panorama(), "keyframes": seg["keyframes"],
+                "first": seg["first"], "last": seg["last"]}
+
+    def add_keyframe(seg, index, frame, features, R):
+        G = seg["key"]["G"] @ R
+        seg["canvas"].add(frame, G, timer)
+        seg["keyframes"].append(index)
+        seg["key"] = {"index": index, "shape": frame.shape, "features": features, "G": G}
+        seg["pending"] = None
+        seg["R"] = np.eye(3)
+        stats["keyframes"] += 1
+
+    def track(seg, frame, features, H_pred):
+        key = seg["key"]
+        for guess in ([H_pred, None] if H_pred is not None else [None]):
+            with timer.stage("match"):
+                mkpts_k, mkpts_f = guided_match(key["features"], features, key["shape"],
+                                                frame.shape, guess, radius, matcher_engine)
+            if len(mkpts_k) < 4:
+                continue
+            with timer.stage("homography"):
+                R, mask = find_homography(mkpts_k, mkpts_f)
+            if R is not None and int(mask.sum()) >= min_inliers:
+                if guess is None and H_pred is not None:
+                    stats["relocalized"] += 1
+                return R
+        return None
+
+    for index, frame in frames:
+        stats["frames"] += 1
+        with timer.stage("detect"):
+            features = detect(frame)
+        if segment is None:
+            segment = start_segment(index, frame, features)
+            continue
+
+        # Constant velocity: last frame -> keyframe, then one more step of motion
+        H_pred = segment["R"] @ segment["motion"] if segment["motion"] is not None else segment["R"]
+        R = track(segment, frame, features, H_pred)
+        if R is None:
+            stats["lost"] += 1
+            segment["lost"] += 1
+            if segment["lost"] > max_lost:
+                yield finish_segment(segment)
+                segment = None
+            continue
+        segment["lost"] = 0
+        segment["motion"] = np.linalg.inv(segment["R"]) @ R
+        segment["R"] = R
+        segment["last"] = index
+
+        if overlap_fraction(R, frame.shape, segment["key"]["shape"]) >= keyframe_overlap:
+            # Redundant: remembered only in case the sequence ends here
+            segment["pending"] = (index, frame, features, R)
+            stats["skipped"] += 1
+            continue
+        try:
+            fits = segment["canvas"].fits(frame.shape, segment["key"]["G"] @ R)
+        except ValueError:
+            # The chained homography has degenerated (drift); start afresh
+            fits = False
+        if fits:
+            add_keyframe(segment, index, frame, features, R)
+        else:
+            segment["pending"] = None
+            yield finish_segment(segment)
+            motion = segment["motion"]
+            segment = start_segment(index, frame, features)
+            segment["motion"] = motion
+
+    if segment is not None:
+        yield finish_segment(segment)
+
+
+if __name__ == "__main__":
+    from backend import ImageAlignBackend
+
+    parser = argparse.ArgumentParser(description="Stitch a video or frame directory into panorama segments")
+    parser.add_argument("source", help="video file or directory of frames")
+    parser.add_argument("--method", default="ORB", choices=["SIFT", "ORB"])
+    parser.add_argument("--step", type=int, default=1, help="use every n-th frame")
+    parser.add_argument("--max-dim", type=int, default=None,
+                        help="downscale frames to this longest side before tracking")
+    parser.add_argument("--keyframe-overlap", type=float, default=KEYFRAME_OVERLAP)
+    parser.add_argument("--min-inliers", type=int, default=MIN_INLIERS)
+    parser.add_argument("--radius", type=float, default=SEARCH_RADIUS)
+    parser.add_argument("--max-canvas-mp", type=float, default=STREAM_MAX_CANVAS_PIXELS / 1e6)
+    parser.add_argument("--matcher-engine", default="bf", choices=list(MATCHER_ENGINES))
+    parser.add_argument("--output-dir", default=None)
+    args = parser.parse_args()
+
+    result = ImageAlignBackend().run_stream(
+        args.source, args.method, output_dir=args.output_dir, step=args.step,
+        max_dim=args.max_dim, matcher_engine=args.matcher_engine,
+        keyframe_overlap=args.keyframe_overlap, min_inliers=args.min_inliers,
+        radius=args.radius, max_canvas_pixels=int(args.max_canvas_mp * 1e6))
+    for segment in result["segments"]:
+        print(f"[SAVED] {segment['stitched']} (frames {segment['first']}-{segment['last']}, "
+              f"{len(segment['keyframes'])} keyframes)")
+    print(f"[STREAM] {result['stats']}")
@@ -1,21 +1,57 @@
 import cv2
-import cv2
 import numpy as np
 import os
 
+# Match colours are drawn from a fixed-size random palette so lines can be
+# rendered with one cv2.polylines call per colour instead of one per match
+PALETTE_SIZE = 64
+
+
+def _subsample(n, max_points):
+    if max_points is None or n <= max_points:
+        return None
+    return np.linspace(0, n - 1, max_points).astype(np.intp)
+
+
+def _disk_offsets(radius):
+    # Same footprint as a filled cv2.circle: dx^2 + dy^2 <= r^2
+    r = int(radius)
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    inside = dx * dx + dy * dy <= r * r
+    return dy[inside], dx[inside]
+
 
-def draw_keypoints(img, kpts, save_path=None, radius=3, color=(0, 255, 0)):
+def _stamp_disks(out, pts, radius, colors):
+    # Raster write of every filled disk in one fancy-indexing pass.
+    # `colors` is either a single BGR tuple or one row per point.
+    if len(pts) == 0:
+        return
+    dy, dx = _disk_offsets(radius)
+    ys = pts[:, 1, None] + dy[None, :]
+    xs = pts[:, 0, None] + dx[None, :]
+    h, w = out.shape[:2]
+    valid = (ys >= 0) & (ys < h) & (xs >= 0) & (xs < w)
+    colors = np.asarray(colors, dtype=np.uint8)
+    if colors.ndim == 1:
+        out[ys[valid], xs[valid]] = colors
+    else:
+        out[ys[valid], xs[valid]] = np.broadcast_to(colors[:, None, :], ys.shape + (3,))[valid]
+
+
+def draw_keypoints(img, kpts, save_path=None, radius=3, color=(0, 255, 0), max_points=None):
     out = img.copy()
-    for p in kpts:
-        pt = tuple(np.int32(p))
-        cv2.circle(out, pt, radius, color, -1)
+    pts = np.asarray(kpts, dtype=np.float32).reshape(-1, 2)
+    idx = _subsample(len(pts), max_points)
+    if idx is not None:
+        pts = pts[idx]
+    _stamp_disks(out, pts.astype(np.int32), radius, color)
     if save_path:
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
         cv2.imwrite(save_path, out)
     return out
 
 
-def draw_matches(img1, img2, mkpts0, mkpts1, save_path=None):
+def draw_matches(img1, img2, mkpts0, mkpts1, save_path=None, max_matches=None, seed=None):
     h1, w1 = img1.shape[:2]
     h2, w2 = img2.shape[:2]
     out_h = max(h1, h2)
@@ -24,16 +60,30 @@ def draw_matches(img1, img2, mkpts0, mkpts1, save_path=None):
     out[:h1, :w1] = img1
     out[:h2, w1:w1 + w2] = img2
 
-    for p1, p2 in zip(mkpts0, mkpts1):
-        color = tuple(np.random.randint(0, 255, 3).tolist())
-        p1 = tuple(np.int32(p1))
-        p2 = tuple(np.int32(p2 + np.array([w1, 0])))
-        cv2.line(out, p1, p2, color, 1)
-        cv2.circle(out, p1, 3, color, -1)
-        cv2.circle(out, p2, 3, color, -1)
+    p1 = np.asarray(mkpts0, dtype=np.float32).reshape(-1, 2)
+    p2 = np.asarray(mkpts1, dtype=np.float32).reshape(-1, 2)
+    idx = _subsample(len(p1), max_matches)
+    if idx is not None:
+        p1, p2 = p1[idx], p2[idx]
+    p1 = p1.astype(np.int32)
+    p2 = (p2 + np.array([w1, 0], dtype=np.float32)).astype(np.int32)
+
+    rng = np.random.default_rng(seed)
+    palette = rng.integers(0, 255, (PALETTE_SIZE, 3), dtype=np.uint8)
+    color_idx = rng.integers(0, PALETTE_SIZE, len(p1))
+
+    # Lines: one polylines call per palette colour
+    segments = np.stack([p1, p2], axis=1)
+    for c in np.unique(color_idx):
+        cv2.polylines(out, segments[color_idx == c], False, palette[c].tolist(), 1)
+
+    # End points: one raster pass for all circles
+    colors = palette[color_idx]
+    _stamp_disks(out, p1, 3, colors)
+    _stamp_disks(out, p2, 3, colors)
 
     if save_path:
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
         cv2.imwrite(save_path, out)
 
-    return out
\ No newline at end of file
+    return out
@@ -1,33 +1,53 @@
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
-def split_images_in_dir(input_dir, output_dir):
-    os.makedirs(output_dir, exist_ok=True)
+VALID_EXT = {".jpg", ".jpeg", ".png"}
 
-    valid_ext = {".jpg", ".jpeg", ".png"}
 
-    for filename in os.listdir(input_dir):
-        base, ext = os.path.splitext(filename.lower())
-        if ext not in valid_ext:
-            continue  # skip non-image files
+def list_images(input_dir):
+    return sorted(f for f in os.listdir(input_dir)
+                  if os.path.splitext(f.lower())[1] in VALID_EXT)
 
-        input_path = os.path.join(input_dir, filename)
-        img = Image.open(input_path)
-        w, h = img.size
 
-        left_width = int(w * 0.7)
-        right_width = int(w * 0.7)
+def split_image(input_path, output_dir, crop_fraction=0.7):
+    # Left and right crops, each crop_fraction of the width, saved as
+    # <name>_1 / <name>_2 next to each other in output_dir
+    filename = os.path.basename(input_path)
+    ext = os.path.splitext(filename.lower())[1]
+    img = Image.open(input_path)
+    w, h = img.size
 
-        # Crop left and right
-        left_crop = img.crop((0, 0, left_width, h))
-        right_crop = img.crop((w - right_width, 0, w, h))
+    left_width = int(w * crop_fraction)
+    right_width = int(w * crop_fraction)
 
-        # Save results
-        out_base = os.path.splitext(filename)[0]
-        left_crop.save(os.path.join(output_dir, f"{out_base}_1{ext}"))
-        right_crop.save(os.path.join(output_dir, f"{out_base}_2{ext}"))
+    # Crop left and right
+    left_crop = img.crop((0, 0, left_width, h))
+    right_crop = img.crop((w - right_width, 0, w, h))
 
-        print(f"Processed: {filename}")
+    # Save results
+    out_base = os.path.splitext(filename)[0]
+    left_crop.save(os.path.join(output_dir, f"{out_base}_1{ext}"))
+    right_crop.save(os.path.join(output_dir, f"{out_base}_2{ext}"))
+    return filename
 
 
-split_images_in_dir("input_images", "output_images")
\ No newline at end of file
+def split_images_in_dir(input_dir, output_dir, crop_fraction=0.7, workers=None):
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [os.path.join(input_dir, f) for f in list_images(input_dir)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for filename in pool.map(split_image, paths, [output_dir] * len(paths),
+                                 [crop_fraction] * len(paths)):
+            print(f"Processed: {filename}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split images into overlapping left/right crops")
+    parser.add_argument("input_dir", nargs="?", default="input_images")
+    parser.add_argument("output_dir", nargs="?", default="output_images")
+    parser.add_argument("--crop-fraction", type=float, default=0.7,
+                        help="width of each crop as a fraction of the image width")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    split_images_in_dir(args.input_dir, args.output_dir, args.crop_fraction, args.workers)
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from cropper import list_images
+
+# Each pair is drawn from these ranges (uniform, lo..hi); override on the CLI
+#   overlap     - fraction of the crop width both images share before warping
+#   rotation    - degrees, applied with a random sign
+#   scale       - zoom of image 2 about its centre
+#   perspective - corner jitter of image 2, as a fraction of its size
+#   noise       - Gaussian noise sigma in grey levels, added to both images
+DEFAULT_RANGES = {
+    "overlap": (0.3, 0.6),
+    "rotation": (0.0, 10.0),
+    "scale": (0.9, 1.1),
+    "perspective": (0.0, 0.03),
+    "noise": (0.0, 2.0),
+}
+GROUND_TRUTH_FILE = "homography.txt"
+# cv2.warpPerspective cannot address coordinates beyond SHRT_MAX
+MAX_SIDE = 32767
+
+
+def _translate(x, y):
+    return np.array([[1, 0, x], [0, 1, y], [0, 0, 1]], dtype=np.float64)
+
+
+def make_pair(src, overlap, rotation=0.0, scale=1.0, perspective=0.0, noise=0.0, rng=None):
+    # Image 1 is the left crop of `src`; image 2 is the right crop seen
+    # through a rotation / scale / perspective change. Returns
+    # (img1, img2, H) with H mapping image 2 pixels onto image 1 exactly.
+    rng = rng or np.random.default_rng()
+    h, w = src.shape[:2]
+    crop_w = int(w / (2 - overlap))
+    x0 = w - crop_w
+    img1 = src[:, :crop_w].copy()
+
+    cx, cy = crop_w / 2, h / 2
+    A = np.vstack([cv2.getRotationMatrix2D((cx, cy), rotation, scale), [0, 0, 1]])
+    corners = np.float32([[0, 0], [crop_w, 0], [crop_w, h], [0, h]])
+    jitter = rng.uniform(-perspective, perspective, (4, 2)) * [crop_w, h]
+    J = cv2.getPerspectiveTransform(corners, np.float32(corners + jitter)).astype(np.float64)
+    # Source pixels -> image 2 pixels, rendered in one resampling pass
+    M = J @ A @ _translate(-x0, 0)
+    img2 = cv2.warpPerspective(src, M, (crop_w, h), flags=cv2.INTER_LINEAR)
+
+    if noise > 0:
+        img1 = np.clip(img1 + rng.normal(0, noise, img1.shape), 0, 255).astype(np.uint8)
+        img2 = np.clip(img2 + rng.normal(0, noise, img2.shape), 0, 255).astype(np.uint8)
+
+    # Image 1 coordinates are source coordinates, so H is M inverted
+    H = np.linalg.inv(M)
+    return img1, img2, H / H[2, 2]
+
+
+def draw_params(ranges, rng):
+    params = {name: float(rng.uniform(lo, hi)) for name, (lo, hi) in ranges.items()}
+    params["rotation"] *= rng.choice([-1, 1])
+    return params
+
+
+def resize_longest(img, size):
+    if not size:
+        return img
+    if size > MAX_SIDE:
+        raise ValueError(f"size must be at most {MAX_SIDE}")
+    scale = size / max(img.shape[:2])
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+def generate_pair(spec):
+    # One spec -> one runner-compatible folder: 01.<ext>, 02.<ext>,
+    # homography.txt (image 2 -> image 1) and params.json
+    start = time.perf_counter()
+    src = cv2.imread(spec["source"])
+    if src is None:
+        raise ValueError(f"Could not read {spec['source']}")
+    src = resize_longest(src, spec["size"])
+    rng = np.random.default_rng([spec["seed"], spec["index"]])
+    params = draw_params(spec["ranges"], rng)
+    img1, img2, H = make_pair(src, rng=rng, **params)
+
+    folder = os.path.join(spec["output_dir"], spec["name"])
+    os.makedirs(folder, exist_ok=True)
+    write_params = [cv2.IMWRITE_JPEG_QUALITY, spec["quality"]] if spec["ext"] in (".jpg", ".jpeg") else []
+    cv2.imwrite(os.path.join(folder, "01" + spec["ext"]), img1, write_params)
+    cv2.imwrite(os.path.join(folder, "02" + spec["ext"]), img2, write_params)
+    np.savetxt(os.path.join(folder, GROUND_TRUTH_FILE), H, fmt="%.12g",
+               header="maps 02 pixel coordinates onto 01")
+    with open(os.path.join(folder, "params.json"), "w") as f:
+        json.dump({"source": os.path.basename(spec["source"]), "size": spec["size"],
+                   "seed": spec["seed"], "index": spec["index"], "params": params,
+                   "shape1": list(img1.shape[:2]), "shape2": list(img2.shape[:2])}, f, indent=2)
+    return spec["name"], time.perf_counter() - start
+
+
+def build_specs(input_dir, output_dir, pairs_per_image=1, sizes=(None,), ranges=None, seed=0,
+                ext=".jpg", quality=95):
+    ranges = {**DEFAULT_RANGES, **(ranges or {})}
+    specs = []
+    for filename in list_images(input_dir):
+        base = os.path.splitext(filename)[0]
+        for size in sizes:
+            for k in range(pairs_per_image):
+                specs.append({
+                    "source": os.path.join(input_dir, filename),
+                    "output_dir": output_dir,
+                    "name": f"{base}_{size or 'native'}_{k:03d}",
+                    "size": size,
+                    "ranges": ranges,
+                    # Seeds are per spec, so output does not depend on scheduling
+                    "seed": seed,
+                    "index": len(specs),
+                    "ext": ext,
+                    "quality": quality,
+                })
+    return specs
+
+
+def generate_dataset(specs, workers=None):
+    # Large sizes hold a few full-size images per worker; lower `workers` to fit memory
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, elapsed in pool.map(generate_pair, specs):
+            print(f"Generated: {name} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic stitching pairs with ground-truth homographies")
+    parser.add_argument("input_dir", nargs="?", default="input_images")
+    parser.add_argument("output_dir", nargs="?", default="synthetic_pairs")
+    parser.add_argument("--pairs", type=int, default=4, help="pairs per source image and size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=None,
+                        help=f"longest side of the source before cropping (up to {MAX_SIDE}); default native")
+    for name, (lo, hi) in DEFAULT_RANGES.items():
+        parser.add_argument(f"--{name}", type=float, nargs=2, default=(lo, hi), metavar=("LO", "HI"))
+    parser.add_argument("--ext", choices=[".jpg", ".png"], default=".jpg")
+    parser.add_argument("--quality", type=int, default=95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    ranges = {name: tuple(getattr(args, name)) for name in DEFAULT_RANGES}
+    specs = build_specs(args.input_dir, args.output_dir, args.pairs, args.sizes or [None],
+                        ranges, args.seed, args.ext, args.quality)
+    generate_dataset(specs, args.workers)
@@ -1,114 +1,25 @@
 import os
+import sys
 import cv2
-import numpy as np
-from skimage.metrics import structural_similarity as ssim
-import math
 
-
-# ===============================
-# Resize helper
-# ===============================
-def resize_to_match(img1, img2):
-    h, w = img1.shape[:2]
-    return cv2.resize(img2, (w, h), interpolation=cv2.INTER_AREA)
-
-
-# ===============================
-# SSIM
-# ===============================
-def compute_ssim(img_ref, img_test):
-    img_test = resize_to_match(img_ref, img_test)
-    gray1 = cv2.cvtColor(img_ref, cv2.COLOR_BGR2GRAY)
-    gray2 = cv2.cvtColor(img_test, cv2.COLOR_BGR2GRAY)
-    score, _ = ssim(gray1, gray2, full=True)
-    return score
-
-
-# ===============================
-# MSE
-# ===============================
-def compute_mse(img_ref, img_test):
-    img_test = resize_to_match(img_ref, img_test)
-    return np.mean((img_ref.astype("float") - img_test.astype("float")) ** 2)
-
-
-# ===============================
-# PSNR
-# ===============================
-def compute_psnr(img_ref, img_test):
-    mse = compute_mse(img_ref, img_test)
-    if mse == 0:
-        return float("inf")
-    return 10 * math.log10((255.0 ** 2) / mse)
-
-
-# ===============================
-# Feature matching - SIFT
-# ===============================
-def match_rate_sift(img_ref, img_test):
-    img_test = resize_to_match(img_ref, img_test)
-    gray_ref = cv2.cvtColor(img_ref, cv2.COLOR_BGR2GRAY)
-    gray_test = cv2.cvtColor(img_test, cv2.COLOR_BGR2GRAY)
-    sift = cv2.SIFT_create()
-    kp1, des1 = sift.detectAndCompute(gray_ref, None)
-    kp2, des2 = sift.detectAndCompute(gray_test, None)
-    if des1 is None or des2 is None:
-        return 0.0
-    bf = cv2.BFMatcher()
-    matches = bf.knnMatch(des1, des2, k=2)
-    good = []
-    for m, n in matches:
-        if m.distance < 0.75 * n.distance:
-            good.append(m)
-    if len(kp1) == 0:
-        return 0.0
-    return len(good) / len(kp1)
-
-
-# ===============================
-# Feature matching - ORB
-# ===============================
-def match_rate_orb(img_ref, img_test):
-    img_test = resize_to_match(img_ref, img_test)
-    gray_ref = cv2.cvtColor(img_ref, cv2.COLOR_BGR2GRAY)
-    gray_test = cv2.cvtColor(img_test, cv2.COLOR_BGR2GRAY)
-    orb = cv2.ORB_create()
-    kp1, des1 = orb.detectAndCompute(gray_ref, None)
-    kp2, des2 = orb.detectAndCompute(gray_test, None)
-    if des1 is None or des2 is None:
-        return 0.0
-    bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-    matches = bf.match(des1, des2)
-    good = [m for m in matches if m.distance < 60]
-    if len(kp1) == 0:
-        return 0.0
-    return len(good) / len(kp1)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code"))
+from metrics import METRICS, evaluate_pair
 
 
 # ===============================
 # Evaluate wrapper
 # ===============================
-def evaluate_similarity(img_ref, img_blended):
-    ssim_val = compute_ssim(img_ref, img_blended)
-    mse_val = compute_mse(img_ref, img_blended)
-    psnr_val = compute_psnr(img_ref, img_blended)
-    sift_rate = match_rate_sift(img_ref, img_blended)
-    orb_rate = match_rate_orb(img_ref, img_blended)
-    return {
-        "ssim": ssim_val,
-        "mse": mse_val,
-        "psnr": psnr_val,
-        "sift_match_rate": sift_rate,
-        "orb_match_rate": orb_rate
-    }
+def evaluate_similarity(img_ref, img_blended, metrics=METRICS, max_dim=None):
+    return evaluate_pair(img_ref, img_blended, metrics, max_dim)
 
 
 # ===============================
 # Visualization
 # ===============================
-import matplotlib.pyplot as plt
-
 def visualize_result(ref, blended, ssim_value, psnr_value):
+    # matplotlib is only needed when a plot is requested
+    import matplotlib.pyplot as plt
+
     # Resize blended to match reference
     blended_resized = cv2.resize(blended, (ref.shape[1], ref.shape[0]))
     diff = cv2.absdiff(ref, blended_resized)